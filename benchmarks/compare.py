@@ -0,0 +1,73 @@
+import sys
+import json
+import argparse
+
+# Compares two benchmark result files and flags regressions
+
+METRICS = [
+    ("rerun_latency", "p50"), ("rerun_latency", "p95"), ("rerun_latency", "p99"),
+    ("first_render_latency", "p95"), ("chat_rerun_latency", "p95"),
+    ("ttft", "p50"), ("ttft", "p95"),
+    ("html_bytes_per_rerun", "p50"),
+]
+
+
+def load(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(baseline, candidate, threshold):
+    regressions = []
+    print(f"{'metric':<28}{baseline['commit']:>12}{candidate['commit']:>12}{'change':>10}")
+    for section, key in METRICS:
+        before = baseline.get(section, {}).get(key)
+        after = candidate.get(section, {}).get(key)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        print(f"{section + '.' + key:<28}{before:>12.3f}{after:>12.3f}{change:>+10.1%}")
+        if change > threshold:
+            regressions.append(f"{section}.{key}")
+
+    before = baseline.get("import_profile", {}).get("main_cumulative_us")
+    after = candidate.get("import_profile", {}).get("main_cumulative_us")
+    if before and after:
+        change = (after - before) / before
+        print(f"{'cold_import_main_ms':<28}{before / 1000:>12.1f}{after / 1000:>12.1f}{change:>+10.1%}")
+        if change > threshold:
+            regressions.append("cold_import_main_ms")
+
+    before = baseline.get("token_usage", {}).get("prompt_tokens")
+    after = candidate.get("token_usage", {}).get("prompt_tokens")
+    if before and after:
+        change = (after - before) / before
+        print(f"{'prompt_tokens':<28}{before:>12}{after:>12}{change:>+10.1%}")
+        if change > threshold:
+            regressions.append("prompt_tokens")
+
+    before = baseline.get("throughput_reruns_per_second", 0.0)
+    after = candidate.get("throughput_reruns_per_second", 0.0)
+    change = (after - before) / before if before else 0.0
+    print(f"{'throughput_reruns_per_second':<28}{before:>12.2f}{after:>12.2f}{change:>+10.1%}")
+    if change < -threshold:
+        regressions.append("throughput_reruns_per_second")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    regressions = compare(load(args.baseline), load(args.candidate), args.threshold)
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import io
+import json
+import time
+import random
+import hashlib
+import threading
+import urllib.request
+from html import escape
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from PIL import Image
+
+# Local stand-ins for every remote dependency of the app, with configurable latency and error rates
+
+SPECIES = ["human", "droid", "wookiee", "rodian", "twi'lek", "gungan"]
+GENDERS = ["male", "female", "n/a"]
+COLORS = ["blue", "brown", "green", "red", "yellow", "black", "white", "grey"]
+
+
+def fake_character(char_id, base_url):
+    rng = random.Random(char_id)
+    return {
+        "id": char_id,
+        "name": f"Bench Character {char_id}",
+        "height": round(rng.uniform(0.6, 2.3), 2),
+        "mass": rng.randint(30, 150),
+        "gender": rng.choice(GENDERS),
+        "homeworld": rng.choice(["tatooine", "naboo", "coruscant", "kashyyyk"]),
+        "species": rng.choice(SPECIES),
+        "hairColor": rng.choice(COLORS),
+        "eyeColor": rng.choice(COLORS),
+        "skinColor": rng.choice(COLORS),
+        "image": f"{base_url}/images/{char_id}.png",
+    }
+
+
+def fake_image_bytes(seed, size=1024):
+    rng = random.Random(seed)
+    image = Image.new("RGB", (size, size), tuple(rng.randint(0, 255) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class ServiceProfile:
+    __slots__ = ("latency", "jitter", "error_rate")
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+class FakeServices:
+    """One threaded HTTP server hosting the Star Wars API, translator, Groq, Telegram and image stand-ins."""
+
+    def __init__(self, profiles=None, host="127.0.0.1", port=0):
+        self.profiles = {name: ServiceProfile() for name in ("swapi", "translate", "groq", "telegram", "images", "gradio")}
+        self.profiles.update(profiles or {})
+        self.requests = {name: 0 for name in self.profiles}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-services", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def environment(self):
+        """Environment variables that point the app at these stand-ins."""
+        return {
+            "STARWARS_API_URL": f"{self.url}/swapi/{{version}}/api",
+            "GOOGLE_TRANSLATE_URL": f"{self.url}/translate",
+            "GROQ_BASE_URL": f"{self.url}/groq",
+            "GROQ_API_KEY": "bench",
+            "TELEGRAM_API_URL": f"{self.url}/telegram",
+            "TELEGRAM_BOT_TOKEN": "bench",
+            "TELEGRAM_CHAT_ID": "1",
+        }
+
+    def _count(self, service):
+        with self._lock:
+            self.requests[service] += 1
+
+    def _handler_class(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body, content_type="application/json"):
+                if isinstance(body, str):
+                    body = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, status, payload):
+                self._reply(status, json.dumps(payload))
+
+            def _service(self):
+                return urlparse(self.path).path.split("/")[1]
+
+            def _begin(self):
+                service = self._service()
+                if service not in services.profiles:
+                    self._json(404, {"error": "unknown service"})
+                    return None
+                services._count(service)
+                profile = services.profiles[service]
+                profile.delay()
+                if profile.should_fail():
+                    self._json(500 if service != "groq" else 503, {"error": {"message": "injected failure"}})
+                    return None
+                return service
+
+            def do_GET(self):
+                service = self._begin()
+                if service is None:
+                    return
+                parsed = urlparse(self.path)
+                parts = parsed.path.strip("/").split("/")
+                if service == "swapi":
+                    if parts[-1] == "all.json":
+                        self._json(200, [fake_character(char_id, services.url) for char_id in range(1, 89)])
+                    else:
+                        self._json(200, fake_character(int(parts[-1].split(".")[0]), services.url))
+                elif service == "translate":
+                    text = parse_qs(parsed.query).get("q", [""])[0]
+                    translated = "\n".join(f"HE {line}" for line in text.split("\n"))
+                    self._reply(200, f'<html><body><div class="t0">{escape(translated)}</div></body></html>', "text/html")
+                elif service == "images":
+                    self._reply(200, fake_image_bytes(parts[-1]), "image/png")
+                elif service == "telegram":
+                    self._json(200, {"ok": True, "result": {"first_name": "Bench", "username": "bench_bot"}})
+                else:
+                    self._json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                service = self._begin()
+                if service is None:
+                    return
+                if service == "groq":
+                    self._chat_completion(json.loads(body or b"{}"))
+                elif service == "gradio":
+                    prompt = json.loads(body or b"{}").get("prompt", "")
+                    digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:12]
+                    self._json(200, {"data": f"{services.url}/images/{digest}.png"})
+                elif service == "telegram":
+                    self._json(200, {"ok": True, "result": {}})
+                else:
+                    self._json(404, {"error": "not found"})
+
+            def _chat_completion(self, request):
+                model = request.get("model", "fake")
+                prompt_tokens = sum(len(message.get("content", "")) // 3 for message in request.get("messages", []))
+                words = [f"תשובה{index}" for index in range(random.randint(20, 60))]
+                created = int(time.time())
+                if not request.get("stream"):
+                    self._json(200, {
+                        "id": "bench", "object": "chat.completion", "created": created, "model": model,
+                        "choices": [{"index": 0, "finish_reason": "stop", "logprobs": None,
+                                     "message": {"role": "assistant", "content": " ".join(words)}}],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                                  "total_tokens": prompt_tokens + len(words)},
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                token_delay = services.profiles["groq"].latency / 20
+
+                def send_chunk(payload):
+                    data = f"data: {payload}\n\n".encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                for index, word in enumerate(words):
+                    delta = {"content": word + " "}
+                    if index == 0:
+                        delta["role"] = "assistant"
+                    send_chunk(json.dumps({
+                        "id": "bench", "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": None, "logprobs": None}],
+                    }))
+                    time.sleep(token_delay)
+                send_chunk(json.dumps({
+                    "id": "bench", "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop", "logprobs": None}],
+                    "x_groq": {"id": "bench", "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                                                        "total_tokens": prompt_tokens + len(words)}},
+                }))
+                send_chunk("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+class FakeGradioClient:
+    """Stand-in for a gradio_client.Client; predict asks the fake server for an image URL.
+
+    The gradio protocol (config, queue and SSE endpoints) is not reproduced; one POST to
+    /gradio/predict applies the gradio latency and error profile, and the image download
+    in process_result then goes through the fake server.
+    """
+
+    url = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def predict(self, prompt, api_name=None):
+        request = urllib.request.Request(
+            f"{FakeGradioClient.url}/gradio/predict",
+            data=json.dumps({"prompt": prompt}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.load(response)["data"]
+        except OSError as e:
+            raise RuntimeError(f"gradio stand-in failed: {str(e)}")
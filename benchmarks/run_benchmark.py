@@ -0,0 +1,372 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+
+from benchmarks.fake_services import FakeServices, FakeGradioClient, ServiceProfile
+
+# Drives simulated sessions through main.py with Streamlit's AppTest against local stand-ins.
+# Each concurrent session slot is its own process running inside the work copy: AppTest is not
+# safe to run on several threads of one interpreter, and the app writes to relative paths.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FOLDER = os.path.join(REPO_ROOT, 'benchmarks', 'results')
+COPIED_PATHS = ['main.py', 'utils', 'data', 'uploads', '.streamlit']
+# Caches produced at runtime; removed from the work copy for a cold run
+GENERATED_PATHS = ['data/characters.json', 'data/translations.json', 'data/image_cache',
+                   'data/character_prompts.db',
+                   'data/state.db', 'data/state.db-wal', 'data/state.db-shm', 'data/faq.json']
+
+QUESTIONS = [
+    "מי אתה?",
+    "מאיפה אתה?",
+    "מה כוכב הלכת האהוב עליך?",
+    "מה אתה הכי אוהב לעשות?",
+    "מי החבר הכי טוב שלך?",
+]
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pick(pct):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": pick(50),
+        "p95": pick(95),
+        "p99": pick(99),
+        "max": ordered[-1],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def prepare_workdir(cold, services):
+    """Copy the app into a scratch directory so the run never touches the repo's data files."""
+    workdir = tempfile.mkdtemp(prefix='starwars-bench-')
+    for path in COPIED_PATHS:
+        source = os.path.join(REPO_ROOT, path)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(workdir, path), ignore=shutil.ignore_patterns('__pycache__'))
+        elif os.path.isfile(source):
+            shutil.copy2(source, os.path.join(workdir, path))
+    if cold:
+        for path in GENERATED_PATHS:
+            target = os.path.join(workdir, path)
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            elif os.path.exists(target):
+                os.remove(target)
+
+    # Point the character image overrides at the image stand-in
+    images_file = os.path.join(workdir, 'data', 'character_images.json')
+    with open(images_file, 'r', encoding='utf-8') as f:
+        images = json.load(f)
+    images = {char_id: url if not url.startswith('http') else f"{services.url}/images/{char_id}.png"
+              for char_id, url in images.items()}
+    with open(images_file, 'w', encoding='utf-8') as f:
+        json.dump(images, f)
+    return workdir
+
+
+def import_profile(workdir, top=15):
+    """Cold-start import cost of main.py, from a fresh interpreter with -X importtime."""
+    start_time = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=workdir, capture_output=True, text=True,
+    )
+    wall_seconds = time.perf_counter() - start_time
+
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_part, cumulative_us, name = line.split('|', 2)
+        self_us = self_part.split(':', 1)[1]
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), level, int(self_us), int(cumulative_us)))
+
+    main_entry = next((module for module in modules if module[0] == 'main'), None)
+    return {
+        "wall_seconds": wall_seconds,
+        "main_cumulative_us": main_entry[3] if main_entry else None,
+        "top_level_imports": [
+            {"module": name, "cumulative_us": cumulative}
+            for name, level, _, cumulative in sorted(
+                (module for module in modules if module[1] <= 1 and module[0] != 'main'),
+                key=lambda module: module[3], reverse=True,
+            )[:top]
+        ],
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {"first_render": [], "chat_rerun": [], "new_character": [], "ttft": [], "html_bytes": []}
+        self.errors = 0
+
+    def add(self, kind, seconds):
+        with self._lock:
+            self.samples[kind].append(seconds)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+
+def run_session(index, script_path, args, recorder):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(script_path, default_timeout=args.timeout)
+
+    def timed(kind, action):
+        start_time = time.perf_counter()
+        try:
+            action()
+        except Exception as e:
+            print(f"Session {index} {kind} failed: {str(e)}")
+            recorder.error()
+            return
+        recorder.add(kind, time.perf_counter() - start_time)
+        # Markdown/HTML payload the rerun sent to the browser
+        recorder.add("html_bytes", sum(len(element.value.encode('utf-8')) for element in at.markdown))
+        if at.exception:
+            recorder.error()
+
+    timed("first_render", at.run)
+    for turn in range(args.questions):
+        question = QUESTIONS[(index + turn) % len(QUESTIONS)]
+        timed("chat_rerun", lambda: at.chat_input[0].set_value(question).run())
+    if args.new_character:
+        timed("new_character", lambda: at.button[0].click().run())
+
+
+def install_stand_ins(services_url, environment, workdir, models, rpm=1e6, tpm=1e9):
+    os.environ.update(environment)
+    os.environ["GROQ_MODEL"] = ",".join(models)
+    # Admission control limits; the defaults keep the limiter out of the way
+    os.environ["GROQ_RPM_LIMIT"] = str(rpm)
+    os.environ["GROQ_TPM_LIMIT"] = str(tpm)
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+
+    # The app's utils modules must be the work copy's, imported after the environment is set
+    import utils.cartoon_generator
+    FakeGradioClient.url = services_url
+    utils.cartoon_generator._client = FakeGradioClient()
+
+
+def wait_for_background_work(timeout=60):
+    # Pool refills and cartoons still running at exit would fail on the interpreter's executor shutdown
+    from utils.character_pool import get_pool_stats
+    from utils.cartoon_generator import get_queue_stats
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and (get_pool_stats()["pending"] or get_queue_stats()["queue_depth"]):
+        time.sleep(0.1)
+
+
+def _sum_counts(target, counts):
+    for key, value in counts.items():
+        if isinstance(value, (int, float)):
+            target[key] = target.get(key, 0) + value
+
+
+def _process_stats():
+    from utils.admission import get_admission
+    from utils.http_client import get_stats as http_stats
+    from utils.faq import get_stats as faq_stats
+    from utils.answer_cache import get_stats as answer_cache_stats
+    from utils.model_stats import get_usage_stats
+    admission = get_admission().get_stats()
+    answers = answer_cache_stats()
+    faq = faq_stats()
+    return {
+        "admission": {"admitted": admission["admitted"], "shed": admission["shed"]},
+        "outbound_http": {host: {key: value for key, value in counts.items() if key != "latency_avg"}
+                          for host, counts in http_stats().items()},
+        "faq": {"hits": faq["hits"], "misses": faq["misses"]},
+        "answer_cache": {key: answers[key] for key in ("hits", "misses", "coalesced")},
+        "token_usage": {label: {key: entry[key] for key in ("calls", "prompt_tokens", "completion_tokens", "seconds")}
+                        for label, entry in get_usage_stats().items()},
+    }
+
+
+def run_worker(worker, sessions, services_url, environment, workdir, args, results):
+    """Run this slot's sessions one after another and report samples and process-wide stats."""
+    try:
+        install_stand_ins(services_url, environment, workdir, args.models.split(","), args.groq_rpm, args.groq_tpm)
+        recorder = Recorder()
+        import utils.model_stats as model_stats
+        record_ttft = model_stats.record_ttft
+
+        def recording_ttft(model, seconds):
+            recorder.add("ttft", seconds)
+            record_ttft(model, seconds)
+
+        model_stats.record_ttft = recording_ttft
+        script_path = os.path.join(workdir, 'main.py')
+        for index in sessions:
+            run_session(index, script_path, args, recorder)
+        wait_for_background_work()
+        results.put((worker, recorder.samples, recorder.errors, _process_stats()))
+    except Exception as e:
+        print(f"Benchmark worker {worker} failed: {str(e)}")
+        results.put((worker, None, len(sessions), None))
+
+
+def merge_stats(stats):
+    merged = {"admission": {}, "outbound_http": {}, "faq": {}, "answer_cache": {}, "token_usage": {}}
+    for process_stats in stats:
+        for section in ("admission", "faq", "answer_cache"):
+            _sum_counts(merged[section], process_stats[section])
+        for section in ("outbound_http", "token_usage"):
+            for name, counts in process_stats[section].items():
+                _sum_counts(merged[section].setdefault(name, {}), counts)
+    for counts in merged["outbound_http"].values():
+        counts["latency_avg"] = counts["seconds"] / counts["requests"] if counts.get("requests") else 0.0
+    lookups = merged["faq"].get("hits", 0) + merged["faq"].get("misses", 0)
+    merged["faq"]["hit_rate"] = merged["faq"].get("hits", 0) / lookups if lookups else 0.0
+    for entry in merged["token_usage"].values():
+        entry["avg_prompt_tokens"] = entry["prompt_tokens"] / entry["calls"]
+        entry["avg_completion_tokens"] = entry["completion_tokens"] / entry["calls"]
+        entry["avg_seconds"] = entry["seconds"] / entry["calls"]
+    return merged
+
+
+def run(args):
+    profiles = {
+        name: ServiceProfile(getattr(args, f"{name}_latency"), getattr(args, f"{name}_latency") / 4, args.error_rate)
+        for name in ("swapi", "translate", "groq", "images", "gradio", "telegram")
+    }
+    services = FakeServices(profiles).start()
+    workdir = prepare_workdir(args.cold, services)
+    recorder = Recorder()
+    stats = []
+    try:
+        startup = import_profile(workdir)
+        # Spawned workers start from a clean interpreter; none of them shares this process's cwd
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        slots = min(args.concurrency, args.sessions)
+        workers = [
+            context.Process(target=run_worker, args=(
+                worker, list(range(worker, args.sessions, slots)), services.url, services.environment(),
+                workdir, args, results,
+            ))
+            for worker in range(slots)
+        ]
+        start_time = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for _ in workers:
+            _, samples, errors, process_stats = results.get()
+            recorder.errors += errors
+            if samples is not None:
+                for kind, values in samples.items():
+                    recorder.samples[kind].extend(values)
+                stats.append(process_stats)
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start_time
+    finally:
+        services.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    merged = merge_stats(stats)
+    latencies = {kind: samples for kind, samples in recorder.samples.items() if kind not in ("ttft", "html_bytes")}
+    reruns = sum(len(samples) for samples in latencies.values())
+    all_reruns = [s for samples in latencies.values() for s in samples]
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "rerun_latency": percentiles(all_reruns),
+        "first_render_latency": percentiles(recorder.samples["first_render"]),
+        "chat_rerun_latency": percentiles(recorder.samples["chat_rerun"]),
+        "new_character_latency": percentiles(recorder.samples["new_character"]),
+        "ttft": percentiles(recorder.samples["ttft"]),
+        "html_bytes_per_rerun": percentiles(recorder.samples["html_bytes"]),
+        "throughput_reruns_per_second": reruns / elapsed if elapsed else 0.0,
+        "elapsed_seconds": elapsed,
+        "errors": recorder.errors,
+        "remote_requests": dict(services.requests),
+        "admission": merged["admission"],
+        "outbound_http": merged["outbound_http"],
+        "faq": merged["faq"],
+        "answer_cache": merged["answer_cache"],
+        "token_usage": {
+            "prompt_tokens": sum(entry["prompt_tokens"] for entry in merged["token_usage"].values()),
+            "completion_tokens": sum(entry["completion_tokens"] for entry in merged["token_usage"].values()),
+            "by_label": merged["token_usage"],
+        },
+        "import_profile": startup,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark main.py against local stand-ins of every remote service")
+    parser.add_argument("--sessions", type=int, default=20, help="Simulated sessions")
+    parser.add_argument("--concurrency", type=int, default=4, help="Sessions run at the same time, one process each")
+    parser.add_argument("--questions", type=int, default=3, help="Chat questions per session")
+    parser.add_argument("--new-character", action="store_true", help="Click 'load new character' at the end of each session")
+    parser.add_argument("--models", default="bench-70b,bench-8b", help="Comma separated fake Groq models")
+    parser.add_argument("--cold", action="store_true", help="Start without any generated caches")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-rerun timeout in seconds")
+    parser.add_argument("--groq-rpm", type=float, default=1e6, help="Groq requests-per-minute limit given to admission control")
+    parser.add_argument("--groq-tpm", type=float, default=1e9, help="Groq tokens-per-minute limit given to admission control")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Injected error rate for every service")
+    for name, latency in (("swapi", 0.05), ("translate", 0.1), ("groq", 0.5), ("images", 0.05),
+                          ("gradio", 2.0), ("telegram", 0.05)):
+        parser.add_argument(f"--{name}-latency", type=float, default=latency, help=f"Mean {name} latency in seconds")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep the scratch copy of the app")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = run(args)
+
+    output = args.output or os.path.join(RESULTS_FOLDER, f"{result['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+
+    latency = result["rerun_latency"]
+    print(f"Reruns: {latency['count']}, errors: {result['errors']}")
+    if latency["count"]:
+        print(f"Rerun latency p50/p95/p99: {latency['p50']:.3f}/{latency['p95']:.3f}/{latency['p99']:.3f}s")
+    if result["ttft"]["count"]:
+        print(f"TTFT p50/p95: {result['ttft']['p50']:.3f}/{result['ttft']['p95']:.3f}s")
+    if result["html_bytes_per_rerun"]["count"]:
+        print(f"HTML per rerun p50: {result['html_bytes_per_rerun']['p50'] / 1024:.1f} KiB")
+    if result["admission"]["shed"]:
+        print(f"Groq requests shed by admission control: {result['admission']['shed']}")
+    print(f"Throughput: {result['throughput_reruns_per_second']:.2f} reruns/s")
+    startup = result["import_profile"]
+    if startup["main_cumulative_us"]:
+        print(f"Cold import of main.py: {startup['main_cumulative_us'] / 1000:.0f} ms ({startup['wall_seconds']:.2f}s wall)")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
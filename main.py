@@ -1,22 +1,31 @@
 import streamlit as st
 import asyncio
-from io import BytesIO
 import requests
 import random
 import os
-import re
-import json
-from PIL import Image
-from gradio_client import Client
-from deep_translator import GoogleTranslator
-import groq
-from functools import lru_cache
+import time
 from dotenv import load_dotenv
 
 # Initialize components
 from utils.init import initialize
 from utils.counter import initialize_user_count, increment_user_count, get_user_count
-from utils.TelegramSender import TelegramSender
+from utils.TelegramSender import get_telegram_service
+from utils.catalog import random_character, CatalogUnavailable
+from utils.character_pool import take_character
+from utils.translation_cache import translate_many, character_vocabulary
+from utils.render_pipeline import Stage, render_progressively
+from utils.cartoon_generator import cartoon_job
+from utils.image_cache import get_display_image, COLUMN_WIDTH
+from utils.answers import build_messages, max_tokens
+from utils.faq import lookup as faq_lookup
+from utils.answer_cache import make_key, lookup, store, join_flight, finish_flight
+from utils.model_stats import record_ttft, record_usage
+from utils.model_router import get_router, NoModelAvailable
+from utils.admission import Busy, get_admission
+from utils.metrics import span
+from utils.resources import get_groq_client, get_groq_models, character_image_source
+from utils.conversation import new_state, build_context, format_turns, SUMMARY_MAX_TOKENS
+from utils.chat_history import new_history, VISIBLE_MESSAGES
 
 # Set page config at the very beginning
 st.set_page_config(layout="wide", page_title="צ'אט עם דמויות ממלחמת הכוכבים", page_icon="🌟")
@@ -29,90 +38,116 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 # Load environment variables
 load_dotenv()
 
-# Groq API setup
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-groq_client = groq.Groq(api_key=GROQ_API_KEY)
-GROQ_MODELS = os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile").split(",")
+# Groq API setup (the client itself is created on first use)
+GROQ_MODELS = get_groq_models()
 
-CHARACTER_PROMPTS_FILE = os.path.join(DATA_FOLDER, 'character_prompts.json')
+# Per-stage timeouts (seconds) for a character render
+TRANSLATION_TIMEOUT = float(os.getenv("RENDER_TRANSLATION_TIMEOUT", 5))
+IMAGE_TIMEOUT = float(os.getenv("RENDER_IMAGE_TIMEOUT", 5))
+CARTOON_TIMEOUT = float(os.getenv("RENDER_CARTOON_TIMEOUT", 60))
 
-@st.cache_data
-def load_character_images():
-    try:
-        with open(os.path.join(DATA_FOLDER, 'character_images.json'), 'r') as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        st.error(f"Error loading character_images.json: {str(e)}")
-        return {}
-
-CHARACTER_IMAGES = load_character_images()
-
-def load_character_prompts():
-    if os.path.exists(CHARACTER_PROMPTS_FILE):
-        with open(CHARACTER_PROMPTS_FILE, 'r') as file:
-            return json.load(file)
-    return {}
-
-def save_character_prompt(character_name, prompt):
-    prompts = load_character_prompts()
-    prompts[character_name] = prompt
-    with open(CHARACTER_PROMPTS_FILE, 'w') as file:
-        json.dump(prompts, file, indent=2)
-
-def get_or_create_character_prompt(character_name):
-    prompts = load_character_prompts()
-    if character_name in prompts:
-        return prompts[character_name]
-    
-    print ("get_or_create_character_prompt")
-    # If not found, ask Groq to create a prompt in English
-    system_prompt = f"Create a system prompt for a Star Wars chatbot impersonating {character_name}. The prompt should capture the character's personality, speech patterns, and key traits. The response should be in English and start with 'You are {character_name}...'"
-    
-    response = groq_client.chat.completions.create(
+
+def summarize_conversation(previous_summary, turns):
+    response, _ = get_router(GROQ_MODELS).complete(
+        get_groq_client(),
+        label="summary",
         messages=[
-            {"role": "system", "content": "You are an expert on Star Wars characters and their personalities."},
-            {"role": "user", "content": system_prompt},
+            {"role": "system", "content": "You summarize chat conversations. Keep names, facts and open questions, and stay brief."},
+            {"role": "user", "content": f"Previous summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{format_turns(turns)}\n\nWrite the updated summary."},
         ],
-        model=GROQ_MODELS[0],  # Use the first model in the list
         temperature=0.0,
-        max_tokens=int(os.getenv("GROQ_MAX_TOKENS", 1024)),
-        stream=False,
+        max_tokens=SUMMARY_MAX_TOKENS,
     )
-    
-    new_prompt = response.choices[0].message.content
-    save_character_prompt(character_name, new_prompt)
-    return new_prompt
-
-@lru_cache(maxsize=100)
-def ask_groq(character_name, question):    
-    character_prompt = get_or_create_character_prompt(character_name)
-    system_prompt = f"{character_prompt} Always answer in Hebrew and keep responses concise."
-    user_prompt = f"Answer this question in Hebrew: {question}"
-    
-    random.shuffle(GROQ_MODELS)
-    
-    # print(system_prompt)
-    # print(user_prompt)
-    
-    for model in GROQ_MODELS:
-        try:
-            response = groq_client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                model=model,
-                temperature=0.0,
-                max_tokens=int(os.getenv("GROQ_MAX_TOKENS", 1024)),
-                stream=False,
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"Error with model {model}: {str(e)}. Trying next model.")
-
-    return get_random_response()
-
-@st.cache_data
+    return response.choices[0].message.content
+
+def get_conversation_context(history):
+    # The rolling summary lives in session state so each turn is summarized once
+    if 'conversation' not in st.session_state:
+        st.session_state.conversation = new_state()
+    return build_context(history, st.session_state.conversation, summarize_conversation)
+
+def ask_groq_stream(character_name, question, context=()):
+    """Yield the answer text accumulated so far as tokens arrive.
+
+    If a model fails mid-stream the next model starts over, so the yielded
+    text may shrink back to the new model's first tokens.
+    """
+    # Precomputed FAQ answers come first (see utils/faq.py)
+    faq_answer = faq_lookup(character_name, question)
+    if faq_answer is not None:
+        yield faq_answer
+        return
+
+    key = make_key(character_name, question, context)
+    cached_answer = lookup(key)
+    if cached_answer is not None:
+        yield cached_answer
+        return
+
+    # Identical concurrent questions wait for the first one instead of calling Groq again
+    future, owner = join_flight(key)
+    if not owner:
+        answer = future.result()
+        yield answer if answer is not None else get_random_response()
+        return
+
+    router = get_router(GROQ_MODELS)
+    token_budget = max_tokens()
+    cached = None
+
+    try:
+        messages = build_messages(character_name, question, context)
+        for model in router.candidates():
+            reserved = router.admit({"messages": messages, "max_tokens": token_budget})
+            answer = ""
+            usage = None
+            start_time = time.perf_counter()
+            try:
+                with span("groq_attempt", model=model):
+                    stream = get_groq_client().chat.completions.create(
+                        messages=messages,
+                        model=model,
+                        temperature=0.0,
+                        max_tokens=token_budget,
+                        stream=True,
+                        timeout=router.attempt_timeout,
+                    )
+                    for chunk in stream:
+                        # Groq reports the token usage on the last chunk
+                        x_groq = getattr(chunk, "x_groq", None)
+                        usage = getattr(x_groq, "usage", None) or getattr(chunk, "usage", None) or usage
+                        token = chunk.choices[0].delta.content if chunk.choices else None
+                        if not token:
+                            continue
+                        if not answer:
+                            record_ttft(model, time.perf_counter() - start_time)
+                        answer += token
+                        yield answer
+                seconds = time.perf_counter() - start_time
+                router.record_success(model, seconds)
+                if usage is not None:
+                    record_usage(character_name, model, usage, seconds)
+                    get_admission().settle(reserved, usage.total_tokens)
+                store(key, answer)
+                cached = answer
+                return
+            except Exception as e:
+                router.record_failure(model, time.perf_counter() - start_time)
+                get_admission().settle(reserved, 0)
+                print(f"Error with model {model}: {str(e)}. Trying next model.")
+
+        yield get_random_response()
+    except Busy as e:
+        # Shed by admission control: say so instead of pretending to answer
+        print(f"Groq request shed: {str(e)}")
+        yield get_random_response("busy")
+    except NoModelAvailable as e:
+        # The persona could not be generated on any model
+        print(str(e))
+        yield get_random_response()
+    finally:
+        finish_flight(key, future, cached)
+
 def get_random_response(response_type="general"):
     responses = {
         "general": [
@@ -123,6 +158,9 @@ def get_random_response(response_type="general"):
         "planet": [
             'איפשהו בגלקסיה רחוקה, רחוקה...', 'כוכב לכת. כן, אני בטוח שזה היה כוכב לכת.',
             'איפשהו שם בחוץ...', 'כן', 'לא היית רוצה לדעת?', 'אני לא מספר!'
+        ],
+        "busy": [
+            'יש כרגע עומס רב על השרת, נסו לשאול שוב בעוד כמה שניות.',
         ]
     }
     return random.choice(responses.get(response_type, responses["general"]))
@@ -134,39 +172,22 @@ def convert_height_weight(type_value, value):
     return f"{value} {unit}"
 
 def fetch_character():
-    char_id = random.randint(1, 88)
-    print(char_id)
-    url = f"https://rawcdn.githack.com/akabab/starwars-api/0.2.1/api/id/{char_id}.json"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        # A character from the warm pool renders entirely from cache
+        return take_character() or random_character()
+    except (requests.RequestException, CatalogUnavailable) as e:
         st.error(f"שגיאה בטעינת הדמות: {str(e)}")
         return None
 
-# Add a new function to force a new character fetch
-@st.cache_data
-def cached_fetch_character(_):
-    return fetch_character()
-
-@st.cache_resource
-def get_translator():
-    return GoogleTranslator(source='auto', target='iw')
-
-def translate_to_hebrew(text):
-    try:
-        translator = get_translator()
-        return translator.translate(text)
-    except Exception as e:
-        st.error(f"שגיאה בתרגום: {str(e)}")
-        return text
+def translate_attributes(char):
+    # Translate every attribute of the character in one batched request
+    return translate_many(character_vocabulary(char))
 
 
 def get_image(image, char_id):
-    return CHARACTER_IMAGES.get(str(int(char_id)), image)
+    return get_display_image(character_image_source(image, char_id))
 
-def display_character(char):
+async def display_character(char):
     if not char:
         return
 
@@ -174,80 +195,56 @@ def display_character(char):
     st.session_state['character_name'] = character_name
     
     # Display character name as centered title with gold glow effect
-    st.markdown(f"""
-        <h1 class="character-title">
-            {character_name}
-        </h1>
-        <style>
-            .character-title {{
-                text-align: right;
-                font-size: 4vw;
-                margin-bottom: 1px;
-                color: #FFD700; /* Gold color */
-                text-shadow: 0 0 10px #FFD700, 0 0 20px #FFD700, 0 0 30px #FFD700; /* Gold glow effect */
-                font-family: 'Orbitron', sans-serif;
-            }}
-            .info h3 {{
-                font-size: 100%;
-                margin-bottom: 1px;
-            }}
-            /* Responsive styles */
-            @media (min-width: 768px) {{
-            .character-name {{
-                font-size: 4vw; /* Smaller on larger screens */
-            }}
-            .info h3 {{
-                font-size: 2vw; /* Smaller on larger screens */
-            }}
-        }}
-        /* Ensure minimum font size on very small screens */
-        @media (min-width: 768px) {{
-            .character-name {{
-                font-size: 4vw; /* Smaller on larger screens */
-            }}
-            .info h3 {{
-                font-size: 2vw; /* Smaller on larger screens */
-            }}
-        }}
-        /* Ensure minimum font size on very small screens */
-        @media (max-width: 480px) {{
-            .character-name {{
-                font-size: 2rem !important; /* Use rem for better scaling */
-            }}
-            .info h3 {{
-                font-size: 1rem !important; /* Use rem for better scaling */
-            }}
-        }}
-        </style>
-    """, unsafe_allow_html=True)
+    st.markdown(f'<h1 class="character-title">{character_name}</h1>', unsafe_allow_html=True)
 
     # Create two columns
     col1, col2 = st.columns(2)
 
     # Column 1: Character information
     with col1:
-        
-        descriptive_info = "".join([
-            create_descriptive_information(title, key, char.get(key))
-            for title, key in [
-                ('זן', 'species'), ('גובה', 'height'), ('מגדר', 'gender'),
-                ('עולם הבית', 'homeworld'), ('צבע שיער', 'hairColor'),
-                ('צבע עיניים', 'eyeColor'), ('צבע עור', 'skinColor'),
-                ('משקל', 'weight')
-            ]
-        ])
-        st.markdown(f"<div class='info'>{descriptive_info}</div>", unsafe_allow_html=True)
+        info_placeholder = st.empty()
+        info_placeholder.markdown('טוען פרטי דמות...')
 
     # Column 2: Images
     with col2:
-        image_url = get_image(char.get('image'), char.get('id'))
-        st.image(image_url, width=300)
-        
-        with st.spinner('טוען דמות מצוירת...'):
-            generates_hand_drawn_cartoon_style_images(char.get('name'), character_name)
+        image_placeholder = st.empty()
+        cartoon_placeholder = st.empty()
+        cartoon_placeholder.markdown('טוען דמות מצוירת...')
+
+    def on_ready(stage_name, result, error):
+        if error:
+            print(f"Render stage {stage_name} failed: {error!r}")
+
+        if stage_name == 'translations':
+            translations = result or {}
+            descriptive_info = "".join([
+                create_descriptive_information(title, key, char.get(key), translations)
+                for title, key in [
+                    ('זן', 'species'), ('גובה', 'height'), ('מגדר', 'gender'),
+                    ('עולם הבית', 'homeworld'), ('צבע שיער', 'hairColor'),
+                    ('צבע עיניים', 'eyeColor'), ('צבע עור', 'skinColor'),
+                    ('משקל', 'weight')
+                ]
+            ])
+            info_placeholder.markdown(f"<div class='info'>{descriptive_info}</div>", unsafe_allow_html=True)
+        elif stage_name == 'image':
+            if result:
+                image_placeholder.image(result, width=300)
+        elif stage_name == 'cartoon':
+            if result:
+                cartoon_placeholder.image(result, width=300)
+            else:
+                cartoon_placeholder.empty()
+
+    await render_progressively([
+        Stage('translations', translate_attributes, (char,), TRANSLATION_TIMEOUT),
+        Stage('image', get_image, (char.get('image'), char.get('id')), IMAGE_TIMEOUT),
+        # The cartoon waits on the shared cartoon queue, not on a render thread
+        Stage('cartoon', cartoon_job, (char.get('name'), character_name), CARTOON_TIMEOUT, get_display_image),
+    ], on_ready)
 
 # Update the create_descriptive_information function
-def create_descriptive_information(title, key, value):
+def create_descriptive_information(title, key, value, translations):
     # print("key:{} value:{}".format(key, value))
 
     if key in ['height', 'weight']:
@@ -255,141 +252,54 @@ def create_descriptive_information(title, key, value):
     elif key == 'homeworld':
         converted_value = value
     else:
-        converted_value = translate_to_hebrew(str(value)) if value else ""
+        converted_value = translations.get(str(value).strip(), value) if value else ""
     
     return f"<h3>{title}: {converted_value}</h3>" if converted_value else ""
 
 
-def generates_hand_drawn_cartoon_style_images(prompt, character_name):
-    filename = re.sub(r'[^\w\s]', '', character_name).replace(' ', '_') + ".jpg"
-    dest_path = os.path.join(UPLOAD_FOLDER, filename)
-
-    if not os.path.isfile(dest_path):
-        prompt = f"{prompt} from Star Wars"
-        client = Client("fujohnwang/alvdansen-littletinies")
-        cartoon_style_image = client.predict(prompt, api_name="/predict")
-        process_result(cartoon_style_image, dest_path)
-
-    st.image(dest_path, width=300)
-
-def process_result(result, filename):
-    if isinstance(result, str):
-        if os.path.isfile(result):
-            img = Image.open(result)
-        elif result.startswith(('http://', 'https://')):
-            response = requests.get(result)
-            if response.status_code == 200:
-                img = Image.open(BytesIO(response.content))
-            else:
-                raise Exception(f"Failed to download image from URL: {result}")
-        elif result.lower().endswith('.webp'):
-            img = Image.open(result)
-        else:
-            raise Exception(f"Invalid result format: {result}")
-    elif isinstance(result, Image.Image):
-        img = result
-    else:
-        raise Exception(f"Unexpected result format: {type(result)}")
-
-    img = img.convert('RGB')
-    img.save(filename, 'JPEG')
+def show_earlier_messages():
+    st.session_state.chat_visible = st.session_state.get('chat_visible', VISIBLE_MESSAGES) + VISIBLE_MESSAGES
 
 def create_chatbot():
     character_name = st.session_state.get('character_name', "Echo")
-
-    for message in st.session_state.get('messages', []):
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    history = st.session_state.get('messages')
+
+    if history is not None:
+        # Only the latest messages are rendered; older ones sit behind "show earlier"
+        visible = st.session_state.get('chat_visible', VISIBLE_MESSAGES)
+        hidden = len(history) - visible
+        if hidden > 0:
+            st.button(f"הצג הודעות קודמות ({hidden})", key="show_earlier", on_click=show_earlier_messages)
+        for message in history.last(visible):
+            with st.chat_message(message.role):
+                st.markdown(message.content)
     
     prompt = st.chat_input("מה שלומך?")
 
     if prompt:
         st.chat_message("user").markdown(prompt)
-        st.session_state.messages.append({"role": "user", "content": prompt})
-
-        with st.chat_message("assistant"):
-            with st.spinner('מחפש תשובה...'):
-                response = ask_groq(character_name, prompt)
-            st.markdown(response)
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        context = get_conversation_context(st.session_state.messages)
+        st.session_state.messages.append("user", prompt)
+
+        with st.chat_message("assistant"), span("chat_turn"):
+            placeholder = st.empty()
+            placeholder.markdown('מחפש תשובה...')
+            response = ""
+            for response in ask_groq_stream(character_name, prompt, context):
+                placeholder.markdown(response + "▌")
+            placeholder.markdown(response)
+        st.session_state.messages.append("assistant", response)
 
 def load_new_character():
-    # Clear the cache for cached_fetch_character
-    cached_fetch_character.clear()
-    # Fetch a new character with a random parameter to bypass cache
-    st.session_state.character = cached_fetch_character(random.random())
-    st.session_state.messages = [{"role": "assistant", "content": "הי 👋"}]
-
-def hide_streamlit_header_footer():
-    hide_st_style = """
-            <style>
-            #MainMenu {visibility: hidden;}
-            footer {visibility: hidden;}
-            footer:after {
-                content:'goodbye'; 
-                visibility: visible;
-                display: block;
-                position: relative;
-                #background-color: red;
-                padding: 5px;
-                top: 2px;
-            }
-            header {visibility: hidden;}
-            #root > div:nth-child(1) > div > div > div > div > section > div {padding-top: 0rem;}
-            </style>
-            """
-    st.markdown(hide_st_style, unsafe_allow_html=True)
-    
+    st.session_state.character = fetch_character()
+    st.session_state.messages = new_history()
+    st.session_state.conversation = new_state()
+    st.session_state.chat_visible = VISIBLE_MESSAGES
+
 async def main():
     title, image_path, footer_content = initialize()
-    hide_streamlit_header_footer()
     
-    st.markdown(f"""
-    <h1 class="character-name">
-        {title}
-    </h1>
-    <style>
-        @keyframes sparkle-red {{
-            0% {{ text-shadow: 0 0 10px #FF0000, 0 0 20px #FF0000, 0 0 30px #FF0000; }}
-            25% {{ text-shadow: 0 0 10px #DC143C, 0 0 20px #DC143C, 0 0 30px #DC143C; }}
-            50% {{ text-shadow: 0 0 10px #B22222, 0 0 20px #B22222, 0 0 30px #B22222; }}
-            75% {{ text-shadow: 0 0 10px #8B0000, 0 0 20px #8B0000, 0 0 30px #8B0000; }}
-            100% {{ text-shadow: 0 0 10px #FF0000, 0 0 20px #FF0000, 0 0 30px #FF0000; }}
-        }}
-        
-        .character-name {{
-            text-align: right;
-            font-size: 8vw; /* Default to a responsive size */
-            margin-bottom: 1px;
-            font-family: 'Orbitron', sans-serif;
-            font-weight: 600;
-            color: #FF0000;
-            animation: sparkle-red 2s infinite alternate;
-        }}
-        .info h3 {{
-            font-size: 4vw; /* Default to a responsive size */
-            margin-bottom: 1px;
-        }}
-        /* Responsive styles */
-        @media (min-width: 768px) {{
-            .character-name {{
-                font-size: 4vw; /* Smaller on larger screens */
-            }}
-            .info h3 {{
-                font-size: 2vw; /* Smaller on larger screens */
-            }}
-        }}
-        /* Ensure minimum font size on very small screens */
-        @media (max-width: 480px) {{
-            .character-name {{
-                font-size: 2rem !important; /* Use rem for better scaling */
-            }}
-            .info h3 {{
-                font-size: 1rem !important; /* Use rem for better scaling */
-            }}
-        }}
-    </style>
-""", unsafe_allow_html=True)
+    st.markdown(f'<h1 class="character-name">{title}</h1>', unsafe_allow_html=True)
 
     with st.expander('אודות האפליקציה - נוצרה ע"י שגיא בר און'):
         st.markdown('''
@@ -405,7 +315,7 @@ async def main():
     if image_path:
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
-            st.image(image_path, use_column_width=True)
+            st.image(get_display_image(image_path, COLUMN_WIDTH) or image_path, use_column_width=True)
 
     if st.button("טען דמות חדשה"):
         load_new_character()
@@ -413,12 +323,13 @@ async def main():
 
     if 'character' not in st.session_state or not st.session_state.character:
         with st.spinner('טוען דמות ראשונית...'):
-            st.session_state.character = cached_fetch_character(random.random())
+            st.session_state.character = fetch_character()
     
     if st.session_state.character:
-        display_character(st.session_state.character)
+        with span("character_render"):
+            await display_character(st.session_state.character)
         if "messages" not in st.session_state:
-            st.session_state.messages = [{"role": "assistant", "content": "הי 👋"}]
+            st.session_state.messages = new_history()
     
     create_chatbot()
 
@@ -429,16 +340,11 @@ async def main():
     user_count = get_user_count(formatted=True)
     st.markdown(f"<p class='user-count' style='color: #4B0082;'>סה\"כ משתמשים: {user_count}</p>", unsafe_allow_html=True)
 
-async def send_telegram_message_and_file(message, file_path):
-    sender = st.session_state.telegram_sender
-    try:
-        await sender.send_document(file_path, message)
-    finally:
-        await sender.close_session()
+def send_telegram_message_and_file(message, file_path):
+    # Queued on the process-wide sender; delivery happens in the background
+    get_telegram_service().send_document(file_path, message)
 
 if __name__ == "__main__":
-    if 'telegram_sender' not in st.session_state:
-        st.session_state.telegram_sender = TelegramSender()
     if 'counted' not in st.session_state:
         st.session_state.counted = True
         increment_user_count()
@@ -1,38 +1,75 @@
 import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
 import asyncio
-import aiohttp
 from typing import Optional
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Outbound queue and delivery settings
+QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", 100))
+MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 3))
+TEXT_BATCH_WINDOW = float(os.getenv("TELEGRAM_BATCH_WINDOW", 2))
+MAX_MESSAGE_LENGTH = 4096
+LATENCY_WINDOW = 100
+
+
 class TelegramSender:
     def __init__(self):
         self.bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
         self.chat_id = os.getenv("TELEGRAM_CHAT_ID")
         if not self.bot_token or not self.chat_id:
             raise ValueError("TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID must be set in environment variables")
-        self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
+        api_url = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+        self.base_url = f"{api_url}/bot{self.bot_token}"
         self.session = None
 
     async def ensure_session(self):
+        # One pooled keep-alive session for the life of the sender
         if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
+            import aiohttp
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=60),
+            )
 
     async def close_session(self):
         if self.session and not self.session.closed:
             await self.session.close()
 
-    async def _make_request(self, method: str, endpoint: str, **kwargs):
+    async def _make_request(self, method: str, endpoint: str, build_data=None, **kwargs):
         await self.ensure_session()
         url = f"{self.base_url}/{endpoint}"
+        for attempt in range(MAX_RETRIES + 1):
+            # Form data with files can only be sent once, so rebuild it for each attempt
+            if build_data:
+                with build_data() as data:
+                    status, result = await self._send(method, url, data=data, **kwargs)
+            else:
+                status, result = await self._send(method, url, **kwargs)
+            if status == 200:
+                return result
+            retry_after = (result or {}).get("parameters", {}).get("retry_after")
+            if status == 429 and retry_after and attempt < MAX_RETRIES:
+                print(f"Rate limited on {endpoint}, retrying in {retry_after}s")
+                await asyncio.sleep(retry_after)
+                continue
+            print(f"Failed to {endpoint}. Status: {status}")
+            print(f"Response: {result}")
+            return None
+
+    async def _send(self, method, url, **kwargs):
+        import aiohttp
         async with getattr(self.session, method)(url, **kwargs) as response:
-            if response.status != 200:
-                print(f"Failed to {endpoint}. Status: {response.status}")
-                print(f"Response: {await response.text()}")
-                return None
-            return await response.json()
+            try:
+                result = await response.json()
+            except (aiohttp.ContentTypeError, ValueError):
+                result = {"description": await response.text()}
+            return response.status, result
 
     async def verify_bot_token(self):
         result = await self._make_request('get', 'getMe')
@@ -49,33 +86,156 @@ class TelegramSender:
         }
         if title:
             params["text"] = f"<b>{title}</b>\n\n{text}"
-        
+
         result = await self._make_request('post', 'sendMessage', params=params)
         if result:
             print("Message sent successfully")
+        return result
 
-    async def send_image_and_text(self, image_path: str, caption: Optional[str] = None) -> None:
-        data = aiohttp.FormData()
-        data.add_field("chat_id", self.chat_id)
-        data.add_field("photo", open(image_path, "rb"))
-        if caption:
-            data.add_field("caption", caption)
+    @contextmanager
+    def _file_form(self, field: str, path: str, caption: Optional[str]):
+        # The file is streamed from disk and its handle closed once the request is done
+        import aiohttp
+        with open(path, "rb") as file:
+            data = aiohttp.FormData()
+            data.add_field("chat_id", self.chat_id)
+            data.add_field(field, file, filename=os.path.basename(path))
+            if caption:
+                data.add_field("caption", caption)
+            yield data
 
-        result = await self._make_request('post', 'sendPhoto', data=data)
+    async def send_image_and_text(self, image_path: str, caption: Optional[str] = None) -> None:
+        result = await self._make_request('post', 'sendPhoto', build_data=lambda: self._file_form("photo", image_path, caption))
         if result:
             print("Image sent successfully")
+        return result
 
     async def send_document(self, document_path: str, caption: Optional[str] = None) -> None:
-        data = aiohttp.FormData()
-        data.add_field("chat_id", self.chat_id)
-        data.add_field("document", open(document_path, "rb"))
-        if caption:
-            data.add_field("caption", caption)
-
-        result = await self._make_request('post', 'sendDocument', data=data)
+        result = await self._make_request('post', 'sendDocument', build_data=lambda: self._file_form("document", document_path, caption))
         if result:
             print("Document sent successfully")
-            
+        return result
+
+
+class TelegramService:
+    """Process-wide sender that delivers queued messages from a background event loop."""
+
+    def __init__(self, sender: Optional[TelegramSender] = None, queue_size: int = QUEUE_SIZE):
+        self.sender = sender or TelegramSender()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._stats = {"queued": 0, "dropped": 0, "delivered": 0, "failed": 0}
+        self._loop = asyncio.new_event_loop()
+        self._queue = None
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(queue_size, ready), name="telegram-sender", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def _run(self, queue_size, ready):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        ready.set()
+        self._loop.run_until_complete(self._worker())
+
+    def _enqueue(self, job):
+        def put():
+            try:
+                self._queue.put_nowait(job)
+                self._count("queued")
+            except asyncio.QueueFull:
+                self._count("dropped")
+                print(f"Telegram queue full, dropping {job[0]}")
+
+        self._loop.call_soon_threadsafe(put)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def notify(self, text: str, title: Optional[str] = None) -> None:
+        """Queue a text notification; notifications close together are sent as one message."""
+        if title:
+            text = f"<b>{title}</b>\n\n{text}"
+        self._enqueue(("text", text, None, time.perf_counter()))
+
+    def send_image(self, image_path: str, caption: Optional[str] = None) -> None:
+        self._enqueue(("photo", image_path, caption, time.perf_counter()))
+
+    def send_document(self, document_path: str, caption: Optional[str] = None) -> None:
+        self._enqueue(("document", document_path, caption, time.perf_counter()))
+
+    async def _next_text_batch(self, first_job):
+        jobs = [first_job]
+        length = len(first_job[1])
+        deadline = self._loop.time() + TEXT_BATCH_WINDOW
+        while True:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                job = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if job[0] != "text" or length + len(job[1]) + 2 > MAX_MESSAGE_LENGTH:
+                # Deliver the batch first, then this job
+                return jobs, job
+            jobs.append(job)
+            length += len(job[1]) + 2
+        return jobs, None
+
+    async def _deliver(self, jobs):
+        kind, payload, caption, _ = jobs[0]
+        try:
+            if kind == "text":
+                result = await self.sender.send_message("\n\n".join(job[1] for job in jobs))
+            elif kind == "photo":
+                result = await self.sender.send_image_and_text(payload, caption)
+            else:
+                result = await self.sender.send_document(payload, caption)
+        except Exception as e:
+            print(f"Error delivering Telegram {kind}: {str(e)}")
+            result = None
+        now = time.perf_counter()
+        with self._lock:
+            for job in jobs:
+                self._stats["delivered" if result else "failed"] += 1
+                self._latencies.append(now - job[3])
+
+    async def _worker(self):
+        carried = None
+        while True:
+            job = carried or await self._queue.get()
+            carried = None
+            if job[0] == "text":
+                jobs, carried = await self._next_text_batch(job)
+            else:
+                jobs = [job]
+            await self._deliver(jobs)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+        stats["queue_depth"] = self._queue.qsize()
+        if latencies:
+            stats["latency_avg"] = sum(latencies) / len(latencies)
+            stats["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return stats
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_telegram_service() -> TelegramService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = TelegramService()
+        return _service
+
+
 # Example usage
 async def main():
     sender = TelegramSender()
@@ -88,4 +248,4 @@ async def main():
         await sender.close_session()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict, deque
+from utils.conversation import estimate_tokens
+from utils.metrics import span, increment
+
+# Admission control for every Groq call: a process-wide token bucket for the account's
+# requests-per-minute and tokens-per-minute limits, with a bounded, per-session fair wait queue.
+# Limits are read when the controller is first used, so a .env loaded after import applies.
+BACKGROUND_SESSION = "background"
+# Batch jobs retry a shed request after this many seconds, doubling each time
+BUSY_BACKOFF = 2.0
+BUSY_RETRIES = 5
+
+_lock = threading.Lock()
+_controller = None
+
+
+class Busy(Exception):
+    """The request was shed: the queue is full or it could not be admitted before its deadline."""
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount):
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+
+class _Waiter:
+    __slots__ = ("session", "cost", "deadline")
+
+    def __init__(self, session, cost, deadline):
+        self.session = session
+        self.cost = cost
+        self.deadline = deadline
+
+
+def current_session():
+    """The Streamlit session making the call, or BACKGROUND_SESSION outside a script run."""
+    if 'streamlit' not in sys.modules:
+        return BACKGROUND_SESSION
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else BACKGROUND_SESSION
+
+
+def request_cost(messages, max_tokens):
+    """Tokens reserved for a request: the estimated prompt plus the whole completion budget."""
+    return sum(estimate_tokens(message.get("content") or "") for message in messages) + max_tokens
+
+
+class AdmissionController:
+    def __init__(self, rpm, tpm, queue_size, session_queue_size, max_wait):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.queue_size = queue_size
+        self.session_queue_size = session_queue_size
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        # session -> waiters in arrival order; sessions take turns in round-robin order
+        self._sessions = OrderedDict()
+        self._waiting = 0
+        self._stats = {"admitted": 0, "shed": 0, "wait_seconds": 0.0}
+
+    def _shed(self, reason):
+        self._stats["shed"] += 1
+        increment("groq_admission", result="shed")
+        raise Busy(reason)
+
+    def _is_next(self, waiter):
+        session, queue = next(iter(self._sessions.items()))
+        return session == waiter.session and queue[0] is waiter
+
+    def _remove(self, waiter):
+        queue = self._sessions[waiter.session]
+        queue.remove(waiter)
+        if not queue:
+            del self._sessions[waiter.session]
+        self._waiting -= 1
+
+    def acquire(self, cost, session=None, max_wait=None):
+        """Block until the request fits the rate limits; return the tokens reserved for it.
+
+        Raises Busy if the queue is full or the request cannot be admitted in time.
+        """
+        session = session or current_session()
+        cost = min(cost, self.tokens.capacity)
+        start_time = time.monotonic()
+        deadline = start_time + (self.max_wait if max_wait is None else max_wait)
+
+        with self._cond, span("groq_admission_wait"):
+            queue = self._sessions.get(session)
+            if self._waiting >= self.queue_size:
+                self._shed("admission queue full")
+            if queue and len(queue) >= self.session_queue_size:
+                self._shed("too many queued requests for this session")
+
+            waiter = _Waiter(session, cost, deadline)
+            self._sessions.setdefault(session, deque()).append(waiter)
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    remaining = deadline - now
+                    delay = None
+                    if self._is_next(waiter):
+                        self.requests.refill(now)
+                        self.tokens.refill(now)
+                        delay = max(self.requests.wait_time(1), self.tokens.wait_time(cost))
+                        if delay == 0:
+                            self.requests.tokens -= 1
+                            self.tokens.tokens -= cost
+                            # Let the next session go first
+                            self._sessions.move_to_end(session)
+                            break
+                        if delay > remaining:
+                            self._shed("rate limit reached")
+                    elif remaining <= 0:
+                        self._shed("timed out waiting for admission")
+                    self._cond.wait(remaining if delay is None else delay)
+            finally:
+                self._remove(waiter)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - start_time
+            self._stats["admitted"] += 1
+            self._stats["wait_seconds"] += waited
+        increment("groq_admission", result="admitted")
+        return cost
+
+    def settle(self, reserved, used):
+        """Return the unused part of a reservation once the real token usage is known."""
+        with self._cond:
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + reserved - used)
+            self._cond.notify_all()
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["waiting"] = self._waiting
+            stats["sessions_waiting"] = len(self._sessions)
+            stats["requests_available"] = self.requests.tokens
+            stats["tokens_available"] = self.tokens.tokens
+        return stats
+
+
+def get_admission():
+    """Return the process-wide controller."""
+    global _controller
+    if _controller is None:
+        with _lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    rpm=float(os.getenv("GROQ_RPM_LIMIT", 30)),
+                    tpm=float(os.getenv("GROQ_TPM_LIMIT", 6000)),
+                    queue_size=int(os.getenv("GROQ_ADMISSION_QUEUE", 64)),
+                    session_queue_size=int(os.getenv("GROQ_ADMISSION_PER_SESSION", 2)),
+                    max_wait=float(os.getenv("GROQ_ADMISSION_WAIT", 15)),
+                )
+    return _controller
+
+
+def retry_when_busy(fn, *args):
+    """Call fn(*args), waiting out the rate limit when it is shed; for batch work, not user requests."""
+    for attempt in range(BUSY_RETRIES + 1):
+        try:
+            return fn(*args)
+        except Busy:
+            if attempt == BUSY_RETRIES:
+                raise
+            time.sleep(BUSY_BACKOFF * (2 ** attempt))
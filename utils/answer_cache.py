@@ -0,0 +1,123 @@
+import os
+import re
+import json
+import hashlib
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from utils.shared_state import get_backend
+
+# Answer cache shared by every session and worker process (main.py is re-executed on each rerun)
+NAMESPACE = 'answers'
+ANSWER_TTL = float(os.getenv("ANSWER_CACHE_TTL", 7 * 24 * 3600))
+MAX_ANSWERS = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 10000))
+MEMORY_ANSWERS = int(os.getenv("ANSWER_CACHE_MEMORY_ENTRIES", 500))
+
+# Hebrew points and cantillation marks (niqqud)
+NIQQUD_PATTERN = re.compile(r'[\u0591-\u05C7]')
+PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+_lock = threading.Lock()
+_memory = OrderedDict()
+_memory_generation = None
+_in_flight = {}
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "coalesced": 0}
+
+
+def normalize_question(question):
+    text = unicodedata.normalize('NFKC', question)
+    text = NIQQUD_PATTERN.sub('', text)
+    text = PUNCTUATION_PATTERN.sub(' ', text)
+    return WHITESPACE_PATTERN.sub(' ', text).strip().lower()
+
+
+def make_key(character_name, question, context=()):
+    """Key an answer by character, normalized question and the conversation context sent with it."""
+    key = f"{character_name}\x1f{normalize_question(question)}"
+    if context:
+        digest = hashlib.sha1(json.dumps(list(context), ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        key = f"{key}\x1f{digest.hexdigest()}"
+    return key
+
+
+def _sync_memory(generation):
+    # Another process invalidated the namespace: the memory copy may hold dropped answers
+    global _memory_generation
+    if generation != _memory_generation:
+        _memory.clear()
+        _memory_generation = generation
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+def _remember(key, answer, expires_at):
+    with _lock:
+        _memory[key] = (answer, expires_at)
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ANSWERS:
+            _memory.popitem(last=False)
+
+
+def lookup(key):
+    now = time.time()
+    backend = get_backend()
+    generation = backend.generation(NAMESPACE)
+    with _lock:
+        _sync_memory(generation)
+        entry = _memory.get(key)
+        if entry and entry[1] > now:
+            _memory.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[0]
+
+    entry = backend.get(NAMESPACE, key)
+    if entry is None:
+        _count("misses")
+        return None
+    _count("hits")
+    _remember(key, entry["answer"], entry["expires_at"])
+    return entry["answer"]
+
+
+def store(key, answer):
+    expires_at = time.time() + ANSWER_TTL
+    backend = get_backend()
+    backend.set(NAMESPACE, key, {"answer": answer, "expires_at": expires_at}, ttl=ANSWER_TTL)
+    evicted = backend.prune(NAMESPACE, MAX_ANSWERS)
+    if evicted:
+        _count("evictions", evicted)
+    _remember(key, answer, expires_at)
+
+
+def join_flight(key):
+    """Return (future, is_owner); only the owner computes, the others wait on the future."""
+    with _lock:
+        future = _in_flight.get(key)
+        if future is not None:
+            _stats["coalesced"] += 1
+            return future, False
+        future = _in_flight[key] = Future()
+        return future, True
+
+
+def finish_flight(key, future, answer=None):
+    """Complete an owned flight; answer None means nothing cacheable was produced."""
+    with _lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+    if not future.done():
+        future.set_result(answer)
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_entries"] = len(_memory)
+        stats["in_flight"] = len(_in_flight)
+    return stats
@@ -0,0 +1,35 @@
+import os
+from utils.personas import get_or_create_character_prompt
+from utils.model_router import get_router
+from utils.resources import get_groq_client, get_groq_models
+
+# The prompt every character answer is generated from, shared by the chat and the FAQ batch.
+# Bump PROMPT_VERSION whenever build_messages changes, so stored FAQ answers are regenerated.
+PROMPT_VERSION = 1
+
+
+def max_tokens():
+    return int(os.getenv("GROQ_MAX_TOKENS", 1024))
+
+
+def build_messages(character_name, question, context=()):
+    character_prompt = get_or_create_character_prompt(character_name)
+    system_prompt = f"{character_prompt} Always answer in Hebrew and keep responses concise."
+    user_prompt = f"Answer this question in Hebrew: {question}"
+    return [
+        {"role": "system", "content": system_prompt},
+        *context,
+        {"role": "user", "content": user_prompt},
+    ]
+
+
+def answer_question(character_name, question, context=()):
+    """Ask Groq for one answer; return (answer, model). Raises Busy or NoModelAvailable."""
+    response, model = get_router(get_groq_models()).complete(
+        get_groq_client(),
+        label=character_name,
+        messages=build_messages(character_name, question, context),
+        temperature=0.0,
+        max_tokens=max_tokens(),
+    )
+    return response.choices[0].message.content, model
@@ -0,0 +1,208 @@
+import os
+import re
+import time
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from PIL import Image
+from utils.metrics import span, increment, record, gauge
+from utils import http_client
+from utils.tools import atomic_write
+
+UPLOAD_FOLDER = "uploads"
+GRADIO_SPACE = os.getenv("CARTOON_GRADIO_SPACE", "fujohnwang/alvdansen-littletinies")
+
+# Bounds for ingesting a generated image
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = float(os.getenv("CARTOON_READ_TIMEOUT", 10))
+DOWNLOAD_TIMEOUT = float(os.getenv("CARTOON_DOWNLOAD_TIMEOUT", 30))
+MAX_DOWNLOAD_BYTES = int(os.getenv("CARTOON_MAX_BYTES", 20 * 1024 * 1024))
+MAX_PIXELS = 40_000_000
+# Longest side of the stored cartoon; the page shows it at 300px (600px on retina screens)
+MAX_SIZE = int(os.getenv("CARTOON_MAX_SIZE", 768))
+JPEG_QUALITY = 90
+CHUNK_SIZE = 64 * 1024
+
+# Process-wide generation queue
+CARTOON_WORKERS = int(os.getenv("CARTOON_WORKERS", 2))
+LATENCY_WINDOW = 100
+
+_lock = threading.Lock()
+# Creating the client does a network handshake; it must not hold up the queue bookkeeping
+_client_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=CARTOON_WORKERS, thread_name_prefix="cartoon")
+_in_flight = {}
+_latencies = deque(maxlen=LATENCY_WINDOW)
+_client = None
+_stats = {"submitted": 0, "deduplicated": 0, "completed": 0, "failed": 0}
+
+
+def cartoon_path(character_name):
+    filename = re.sub(r'[^\w\s]', '', character_name).replace(' ', '_') + ".jpg"
+    return os.path.join(UPLOAD_FOLDER, filename)
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from gradio_client import Client
+                _client = Client(GRADIO_SPACE)
+    return _client
+
+
+def download(url, dest_path):
+    """Stream a URL to dest_path, bounded by DOWNLOAD_TIMEOUT and MAX_DOWNLOAD_BYTES."""
+    deadline = time.monotonic() + DOWNLOAD_TIMEOUT
+    with http_client.get(url, stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)) as response:
+        if response.status_code != 200:
+            raise Exception(f"Failed to download image from URL: {url}")
+        if int(response.headers.get('Content-Length') or 0) > MAX_DOWNLOAD_BYTES:
+            raise Exception(f"Image at {url} is larger than {MAX_DOWNLOAD_BYTES} bytes")
+        size = 0
+        with open(dest_path, 'wb') as f:
+            for chunk in _chunks(response):
+                size += len(chunk)
+                if size > MAX_DOWNLOAD_BYTES:
+                    raise Exception(f"Image at {url} is larger than {MAX_DOWNLOAD_BYTES} bytes")
+                if time.monotonic() > deadline:
+                    raise Exception(f"Download of {url} took longer than {DOWNLOAD_TIMEOUT:.0f}s")
+                f.write(chunk)
+
+
+def _chunks(response):
+    # read1() returns whatever has arrived, so the deadline is checked even when the body trickles in
+    read1 = getattr(response.raw, 'read1', None)
+    if read1 is None:  # urllib3 < 2
+        yield from response.iter_content(CHUNK_SIZE)
+        return
+    while True:
+        chunk = read1(CHUNK_SIZE, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _store(img, source_path, f):
+    """Write img to f as a JPEG no larger than MAX_SIZE, decoding as little as possible."""
+    if img.width * img.height > MAX_PIXELS:
+        raise Exception(f"Image is too large to decode: {img.width}x{img.height}")
+    if source_path and img.format == 'JPEG' and img.mode == 'RGB' and max(img.size) <= MAX_SIZE:
+        # Already in the final format and size: keep the bytes as they are
+        with open(source_path, 'rb') as source:
+            shutil.copyfileobj(source, f)
+        return
+    # thumbnail() lets JPEG decode at a reduced scale and reduces other formats before resampling
+    img.thumbnail((MAX_SIZE, MAX_SIZE), Image.LANCZOS, reducing_gap=2.0)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    img.save(f, 'JPEG', quality=JPEG_QUALITY)
+
+
+def process_result(result, filename):
+    # The cartoon is written with atomic_write, so readers never see a partial image
+    download_path = f"{filename}.{os.getpid()}.{threading.get_ident()}.download"
+    try:
+        if isinstance(result, str):
+            if result.startswith(('http://', 'https://')):
+                download(result, download_path)
+                source_path = download_path
+            elif os.path.isfile(result):
+                source_path = result
+            else:
+                raise Exception(f"Invalid result format: {result}")
+            with Image.open(source_path) as img, atomic_write(filename, 'wb') as f:
+                _store(img, source_path, f)
+        elif isinstance(result, Image.Image):
+            with atomic_write(filename, 'wb') as f:
+                _store(result, None, f)
+        else:
+            raise Exception(f"Unexpected result format: {type(result)}")
+    finally:
+        if os.path.exists(download_path):
+            os.remove(download_path)
+
+
+def generate_cartoon(prompt, dest_path):
+    start_time = time.perf_counter()
+    try:
+        with span("image_generation"):
+            result = get_client().predict(f"{prompt} from Star Wars", api_name="/predict")
+        with span("image_processing"):
+            process_result(result, dest_path)
+    except Exception:
+        with _lock:
+            _stats["failed"] += 1
+        increment("cartoon_jobs", result="failed")
+        raise
+    seconds = time.perf_counter() - start_time
+    with _lock:
+        _stats["completed"] += 1
+        _latencies.append(seconds)
+    increment("cartoon_jobs", result="completed")
+    record("cartoon_job", seconds)
+    return dest_path
+
+
+def _finish(dest_path, future):
+    with _lock:
+        if _in_flight.get(dest_path) is future:
+            del _in_flight[dest_path]
+        gauge("cartoon_queue_depth", len(_in_flight))
+
+
+def submit_cartoon(prompt, character_name):
+    """Queue a cartoon for the character, returning the Future of its file path.
+
+    Concurrent requests for the same character share one job.
+    """
+    dest_path = cartoon_path(character_name)
+    with _lock:
+        future = _in_flight.get(dest_path)
+        if future is not None:
+            _stats["deduplicated"] += 1
+            increment("cartoon_jobs", result="deduplicated")
+            return future
+        _stats["submitted"] += 1
+        future = _executor.submit(generate_cartoon, prompt, dest_path)
+        _in_flight[dest_path] = future
+        gauge("cartoon_queue_depth", len(_in_flight))
+    increment("cartoon_jobs", result="submitted")
+    future.add_done_callback(lambda done: _finish(dest_path, done))
+    return future
+
+
+def set_workers(count):
+    """Resize the generation queue; jobs already queued finish on the old workers."""
+    global _executor
+    with _lock:
+        previous, _executor = _executor, ThreadPoolExecutor(max_workers=count, thread_name_prefix="cartoon")
+    previous.shutdown(wait=False)
+
+
+def cartoon_job(prompt, character_name):
+    """Return a Future of the character's cartoon path, already done if the file exists."""
+    dest_path = cartoon_path(character_name)
+    if os.path.isfile(dest_path):
+        future = Future()
+        future.set_result(dest_path)
+        return future
+    return submit_cartoon(prompt, character_name)
+
+
+def ensure_cartoon(prompt, character_name):
+    """Return the character's cartoon path, generating it on the shared queue if missing."""
+    return cartoon_job(prompt, character_name).result()
+
+
+def get_queue_stats():
+    with _lock:
+        latencies = sorted(_latencies)
+        stats = dict(_stats)
+        stats["queue_depth"] = len(_in_flight)
+    if latencies:
+        stats["latency_avg"] = sum(latencies) / len(latencies)
+        stats["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return stats
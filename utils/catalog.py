@@ -0,0 +1,160 @@
+import os
+import json
+import random
+import argparse
+import threading
+import requests
+from dotenv import load_dotenv
+from utils.metrics import span
+from utils import http_client
+from utils.tools import atomic_write
+
+# Load environment variables
+load_dotenv()
+
+# Local snapshot of the akabab/starwars-api character records
+DATA_FOLDER = 'data'
+CATALOG_FILE = os.path.join(DATA_FOLDER, 'characters.json')
+
+API_VERSION = os.getenv("STARWARS_API_VERSION", "0.2.1")
+API_BASE_URL = os.getenv("STARWARS_API_URL", "https://rawcdn.githack.com/akabab/starwars-api/{version}/api")
+API_TAGS_URL = "https://api.github.com/repos/akabab/starwars-api/tags"
+REQUEST_TIMEOUT = float(os.getenv("STARWARS_API_TIMEOUT", 5))
+
+# Ids served by the upstream API, used when no snapshot is available
+DEFAULT_ID_RANGE = range(1, 89)
+
+# When set, never go to the network; only the local snapshot is used
+OFFLINE = os.getenv("STARWARS_OFFLINE", "0").lower() in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_catalog = None
+
+
+class CatalogUnavailable(Exception):
+    """Offline with no snapshot: there is nowhere to load characters from."""
+
+
+class Catalog:
+    __slots__ = ("version", "ids", "records")
+
+    def __init__(self, version, records):
+        self.version = version
+        self.records = {int(record["id"]): record for record in records if "id" in record}
+        self.ids = tuple(sorted(self.records)) or tuple(DEFAULT_ID_RANGE)
+
+    def get(self, char_id):
+        return self.records.get(int(char_id))
+
+    def random_id(self):
+        return random.choice(self.ids)
+
+
+def load_snapshot(path=CATALOG_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get("version"), data.get("characters", [])
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None, []
+
+
+def save_snapshot(version, characters, path=CATALOG_FILE):
+    with atomic_write(path, 'w', encoding='utf-8') as f:
+        json.dump({"version": version, "characters": characters}, f, ensure_ascii=False, indent=2)
+
+
+def get_catalog():
+    """Return the process-wide catalog, loading the snapshot on first use."""
+    global _catalog
+    if _catalog is None:
+        with _lock:
+            if _catalog is None:
+                version, characters = load_snapshot()
+                if not characters:
+                    print(f"Character snapshot {CATALOG_FILE} not found, run 'python -m utils.catalog refresh'")
+                _catalog = Catalog(version, characters)
+    return _catalog
+
+
+def fetch_remote_character(char_id, version=API_VERSION):
+    url = f"{API_BASE_URL.format(version=version)}/id/{char_id}.json"
+    with span("catalog_fetch"):
+        response = http_client.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def get_character(char_id):
+    catalog = get_catalog()
+    record = catalog.get(char_id)
+    if record is None and OFFLINE and not catalog.records:
+        raise CatalogUnavailable(f"STARWARS_OFFLINE is set and {CATALOG_FILE} is missing or empty; "
+                                 f"run 'python -m utils.catalog refresh'")
+    if record is not None or OFFLINE:
+        return record
+
+    # Not in the snapshot: fetch once and keep it in the in-memory index
+    record = fetch_remote_character(char_id)
+    with _lock:
+        catalog.records[int(char_id)] = record
+    return record
+
+
+def random_character():
+    return get_character(get_catalog().random_id())
+
+
+def latest_upstream_version():
+    response = http_client.get(API_TAGS_URL, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    tags = [tag["name"] for tag in response.json()]
+    if not tags:
+        return API_VERSION
+
+    def version_key(name):
+        return tuple(int(part) if part.isdigit() else 0 for part in name.lstrip('v').split('.'))
+
+    return max(tags, key=version_key)
+
+
+def refresh(version=None, force=False):
+    """Download the full character list into the local snapshot if the upstream version changed."""
+    global _catalog
+    if version is None:
+        try:
+            version = latest_upstream_version()
+        except requests.RequestException as e:
+            print(f"Could not resolve upstream version ({e}), using {API_VERSION}")
+            version = API_VERSION
+
+    current_version, characters = load_snapshot()
+    if current_version == version and characters and not force:
+        print(f"Snapshot already at version {version} ({len(characters)} characters)")
+        return False
+
+    url = f"{API_BASE_URL.format(version=version)}/all.json"
+    response = http_client.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    characters = sorted(response.json(), key=lambda record: record["id"])
+    save_snapshot(version, characters)
+    with _lock:
+        _catalog = Catalog(version, characters)
+    print(f"Snapshot updated {current_version} -> {version} ({len(characters)} characters)")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local Star Wars character catalog")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    refresh_parser = subparsers.add_parser("refresh", help="Update data/characters.json from upstream")
+    refresh_parser.add_argument("--version", help="Upstream version tag (default: latest)")
+    refresh_parser.add_argument("--force", action="store_true", help="Download even if the version is unchanged")
+    subparsers.add_parser("info", help="Show the snapshot version and size")
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        refresh(args.version, args.force)
+    else:
+        catalog = get_catalog()
+        print(f"Version: {catalog.version}, characters: {len(catalog.records)}")
@@ -0,0 +1,98 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from utils.catalog import random_character
+from utils.translation_cache import translate_many, character_vocabulary
+from utils.image_cache import get_display_image
+from utils.cartoon_generator import ensure_cartoon
+from utils.personas import get_or_create_character_prompt
+from utils.resources import character_image_source
+from utils.metrics import span, increment
+
+# Characters prepared in the background so "load new character" renders from warm caches
+POOL_SIZE = int(os.getenv("CHARACTER_POOL_SIZE", 3))
+POOL_WORKERS = int(os.getenv("CHARACTER_POOL_WORKERS", 2))
+# Generating a persona costs a Groq call per prefetched character
+PREPARE_PERSONAS = os.getenv("CHARACTER_POOL_PERSONAS", "1").lower() in ("1", "true", "yes")
+# Random draws that landed on a character already in the pool before giving up
+MAX_DRAWS = 5
+
+_lock = threading.Lock()
+_ready = deque()
+_pending = 0
+_executor = None
+_stats = {"hits": 0, "misses": 0, "prepared": 0, "failed": 0}
+
+
+def prepare_character(char):
+    """Fill every cache the character page reads: translations, images, cartoon and persona."""
+    name = char.get('name')
+    translate_many(character_vocabulary(char))
+    get_display_image(character_image_source(char.get('image'), char.get('id')))
+    try:
+        get_display_image(ensure_cartoon(name, name))
+    except Exception as e:
+        # The page copes without a cartoon; keep the character rather than drop it
+        print(f"Error generating cartoon for pooled character {name}: {str(e)}")
+    if PREPARE_PERSONAS:
+        get_or_create_character_prompt(name)
+    return char
+
+
+def _draw():
+    for _ in range(MAX_DRAWS):
+        char = random_character()
+        with _lock:
+            if all(entry.get('id') != char.get('id') for entry in _ready):
+                return char
+    return char
+
+
+def _refill_one():
+    global _pending
+    try:
+        with span("character_prepare"):
+            char = prepare_character(_draw())
+    except Exception as e:
+        print(f"Error preparing pooled character: {str(e)}")
+        with _lock:
+            _pending -= 1
+            _stats["failed"] += 1
+        return
+    with _lock:
+        _pending -= 1
+        _ready.append(char)
+        _stats["prepared"] += 1
+
+
+def refill():
+    """Start background jobs until the pool plus the jobs in flight reach POOL_SIZE."""
+    global _pending, _executor
+    if POOL_SIZE <= 0:
+        return
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=POOL_WORKERS, thread_name_prefix="character-pool")
+        missing = POOL_SIZE - len(_ready) - _pending
+        _pending += max(0, missing)
+    for _ in range(missing):
+        _executor.submit(_refill_one)
+
+
+def take_character():
+    """Return a prepared character, or None if the pool is empty; either way the pool is topped up."""
+    with _lock:
+        char = _ready.popleft() if _ready else None
+        _stats["hits" if char else "misses"] += 1
+    increment("character_pool", result="hit" if char else "miss")
+    refill()
+    return char
+
+
+def get_pool_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats["ready"] = len(_ready)
+        stats["pending"] = _pending
+    return stats
@@ -0,0 +1,56 @@
+import os
+from collections import deque
+from itertools import islice
+
+# Messages kept in session state; older ones are dropped (they live on in the rolling summary)
+HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", 100))
+# Messages rendered on each rerun; "show earlier" reveals another page of this size
+VISIBLE_MESSAGES = int(os.getenv("CHAT_VISIBLE_MESSAGES", 20))
+
+GREETING = "הי 👋"
+
+
+class ChatMessage:
+    __slots__ = ("role", "content")
+
+    def __init__(self, role, content):
+        self.role = role
+        self.content = content
+
+
+class ChatHistory:
+    """A session's chat messages, capped at max_messages.
+
+    Positions are absolute: `total` counts every message ever added and `start`
+    is the position of the oldest one still kept.
+    """
+
+    __slots__ = ("messages", "total")
+
+    def __init__(self, max_messages=HISTORY_MAX_MESSAGES):
+        self.messages = deque(maxlen=max_messages)
+        self.total = 0
+
+    def __len__(self):
+        return len(self.messages)
+
+    @property
+    def start(self):
+        return self.total - len(self.messages)
+
+    def append(self, role, content):
+        self.messages.append(ChatMessage(role, content))
+        self.total += 1
+
+    def since(self, position):
+        """Messages from absolute position onwards (or from the oldest kept one)."""
+        return list(islice(self.messages, max(0, position - self.start), None))
+
+    def last(self, count):
+        return self.since(self.total - count)
+
+
+def new_history():
+    history = ChatHistory()
+    history.append("assistant", GREETING)
+    return history
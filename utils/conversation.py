@@ -0,0 +1,80 @@
+import os
+
+# Token budget for the conversation history sent with each question
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 600))
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", 6))
+SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", 200))
+# Once the window overflows, this many extra turns are folded in with the overflow,
+# so the summary is rewritten every few questions instead of on each one
+SUMMARY_CHUNK_TURNS = int(os.getenv("CONTEXT_SUMMARY_CHUNK_TURNS", 4))
+# Rough characters-per-token ratio; Hebrew text tokenizes denser than English
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _conversation_turns(messages):
+    # Skip the greeting shown before the user's first question
+    for index, message in enumerate(messages):
+        if message.role == "user":
+            return messages[index:]
+    return []
+
+
+def new_state():
+    return {"summary": "", "summarized_until": 0}
+
+
+def build_context(history, state, summarize, token_budget=CONTEXT_TOKEN_BUDGET, max_turns=CONTEXT_MAX_TURNS,
+                  chunk_turns=SUMMARY_CHUNK_TURNS):
+    """Return the chat messages to send before the current question.
+
+    The most recent turns of `history` (a ChatHistory) are kept verbatim within
+    the token budget; older turns are folded into a rolling summary kept in
+    `state` (the caller's session state), so each turn is summarized once.
+    Folding takes chunk_turns turns beyond the overflow, leaving room in the
+    window for the next questions.
+    Positions in `state` are absolute, so turns the capped history has already
+    dropped stay summarized. summarize(previous_summary, turns) returns the new
+    summary text.
+    """
+    if state["summarized_until"] > history.total:
+        # The conversation was reset
+        state.update(new_state())
+
+    turns = history.since(state["summarized_until"])
+    if state["summarized_until"] == 0:
+        turns = _conversation_turns(turns)
+    start = history.total - len(turns)
+
+    window_start = len(turns)
+    used = 0
+    while window_start > 0 and len(turns) - window_start < max_turns * 2:
+        cost = estimate_tokens(turns[window_start - 1].content)
+        if used + cost > token_budget:
+            break
+        used += cost
+        window_start -= 1
+
+    if window_start > 0:
+        # The latest turn always stays verbatim
+        folded = max(window_start, min(window_start + chunk_turns * 2, len(turns) - 2))
+        try:
+            state["summary"] = summarize(state["summary"], turns[:folded])
+            state["summarized_until"] = start + folded
+            window_start = folded
+        except Exception as e:
+            # Retried on the next question; until then the overflow is left out
+            print(f"Error summarizing conversation: {str(e)}")
+
+    context = []
+    if state["summary"]:
+        context.append({"role": "system", "content": f"Summary of the earlier conversation: {state['summary']}"})
+    context.extend({"role": turn.role, "content": turn.content} for turn in turns[window_start:])
+    return context
+
+
+def format_turns(turns):
+    return "\n".join(f"{turn.role}: {turn.content}" for turn in turns)
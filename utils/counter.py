@@ -1,46 +1,130 @@
 import os
 import json
-import streamlit as st
+import time
+import atexit
+import argparse
+import threading
+from utils.metrics import span
+from utils.shared_state import get_backend
 
-# File to store user count
+# The count lives in the shared state backend; user_count.json only seeds it once
 DATA_FOLDER = 'data'
 USER_COUNT_FILE = os.path.join(DATA_FOLDER, 'user_count.json')
+NAMESPACE = 'counters'
+USER_COUNT_KEY = 'users'
 
-def initialize_user_count():
-    os.makedirs(DATA_FOLDER, exist_ok=True)
-    if not os.path.exists(USER_COUNT_FILE):
-        with open(USER_COUNT_FILE, 'w') as f:
-            json.dump({"count": 0}, f)
+# Increments are buffered per process and flushed in batches by a background thread
+FLUSH_INTERVAL = float(os.getenv("USER_COUNT_FLUSH_INTERVAL", 5))
 
-def get_user_count(formatted=False):
+_lock = threading.Lock()
+_pending = 0
+_cached_count = None
+_flusher = None
+_seeded = False
+
+
+def _read_seed():
     try:
         with open(USER_COUNT_FILE, 'r') as f:
-            data = json.load(f)
-        count = data.get("count", 0)
-        if formatted:            
-            return format_count(count)
-        return count
+            return json.load(f).get("count", 0)
     except (json.JSONDecodeError, FileNotFoundError):
         return 0
 
-def increment_user_count():
-    count = get_user_count()
-    count += 1    
-    with open(USER_COUNT_FILE, 'w') as f:
-        json.dump({"count": count}, f)
+
+def _seed(backend):
+    global _seeded
+    # The first process to get here carries the file's count over for everyone
+    if backend.add('migrations', USER_COUNT_FILE, True):
+        backend.incr(NAMESPACE, USER_COUNT_KEY, _read_seed())
+    _seeded = True
+
+
+def initialize_user_count():
+    _start_flusher()
+
+
+def flush():
+    """Apply this process's pending delta to the shared count and refresh the cached count."""
+    global _pending, _cached_count
+    with _lock:
+        delta, _pending = _pending, 0
+    try:
+        with span("counter_io"):
+            backend = get_backend()
+            if not _seeded:
+                _seed(backend)
+            if delta:
+                count = backend.incr(NAMESPACE, USER_COUNT_KEY, delta)
+            else:
+                count = backend.get(NAMESPACE, USER_COUNT_KEY) or 0
+    except Exception as e:
+        print(f"Error flushing user count: {str(e)}")
+        with _lock:
+            _pending += delta
+        return
+    with _lock:
+        _cached_count = max(0, count)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, name="user-count-flusher", daemon=True)
+        _flusher.start()
+    atexit.register(flush)
+
+
+def _current_count():
+    if _cached_count is None:
+        flush()
+    with _lock:
+        # Still None if the backend is unreachable: show what this process counted
+        return max(0, (_cached_count or 0) + _pending)
+
+
+def get_user_count(formatted=False):
+    count = _current_count()
+    if formatted:
+        return format_count(count)
     return count
 
+
+def _add(delta):
+    global _pending
+    _start_flusher()
+    with _lock:
+        _pending += delta
+    return _current_count()
+
+
+def increment_user_count():
+    return _add(1)
+
+
 def decrement_user_count():
     print("Decrementing user count")
-    
-    count = get_user_count()
-    count = max(0, count - 1)  # Ensure count doesn't go below 0
-    with open(USER_COUNT_FILE, 'w') as f:
-        json.dump({"count": count}, f)
-    return count
+    return _add(-1)
+
 
 def format_count(count):
-    """Format the count with commas and round to nearest thousand if over 1000"""    
+    """Format the count with commas and round to nearest thousand if over 1000"""
     if count >= 1000:
         return f"{count:,}"
     return f"{count:,}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the shared user count")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("check", help="Show the count the page footer would display (0 if the backend is unreachable)")
+    args = parser.parse_args()
+
+    print(get_user_count(formatted=True))
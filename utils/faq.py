@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.answer_cache import normalize_question, make_key, store
+from utils.answers import PROMPT_VERSION, answer_question
+from utils.admission import Busy, retry_when_busy
+from utils.model_router import NoModelAvailable
+from utils.metrics import increment
+from utils.tools import atomic_write
+
+# Precomputed answers to the questions every character gets asked, checked before Groq:
+#   python -m utils.faq build [--characters "Luke Skywalker,Yoda"] [--questions-file questions.txt]
+DATA_FOLDER = 'data'
+FAQ_FILE = os.path.join(DATA_FOLDER, 'faq.json')
+DEFAULT_QUESTIONS = (
+    "מי אתה?",
+    "מאיפה אתה?",
+    "מה כוכב הלכת האהוב עליך?",
+    "who are you?",
+    "where are you from?",
+    "what is your favorite planet?",
+)
+DEFAULT_WORKERS = 4
+# Answers are written to the table in batches, so an interrupted run keeps its work
+CHECKPOINT_EVERY = 20
+
+_lock = threading.Lock()
+# (path, mtime, answers) of the table last read; reloaded when the file changes
+_table = None
+_stats = {"hits": 0, "misses": 0}
+
+
+def _read(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def load_answers(path=FAQ_FILE):
+    """Return {character: {normalized question: answer}}, empty if the table was built from another prompt."""
+    table = _read(path)
+    if table.get("prompt_version") != PROMPT_VERSION:
+        return {}
+    return table.get("answers", {})
+
+
+def _answers():
+    global _table
+    try:
+        mtime = os.stat(FAQ_FILE).st_mtime_ns
+    except OSError:
+        return {}
+    with _lock:
+        if _table is None or _table[:2] != (FAQ_FILE, mtime):
+            _table = (FAQ_FILE, mtime, load_answers(FAQ_FILE))
+        return _table[2]
+
+
+def lookup(character_name, question):
+    """The precomputed answer for this character and question, or None."""
+    answer = _answers().get(character_name, {}).get(normalize_question(question))
+    hit = answer is not None
+    with _lock:
+        _stats["hits" if hit else "misses"] += 1
+    increment("faq", result="hit" if hit else "miss")
+    return answer
+
+
+def save_answers(new_answers, path=FAQ_FILE):
+    """Merge answers into the table and bump its version; return the new version."""
+    with _lock:
+        table = _read(path)
+        answers = table.get("answers", {}) if table.get("prompt_version") == PROMPT_VERSION else {}
+        for character_name, entries in new_answers.items():
+            answers.setdefault(character_name, {}).update(entries)
+        table = {
+            "version": table.get("version", 0) + 1,
+            "prompt_version": PROMPT_VERSION,
+            "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "answers": {name: dict(sorted(entries.items())) for name, entries in sorted(answers.items())},
+        }
+        with atomic_write(path, 'w', encoding='utf-8') as f:
+            json.dump(table, f, ensure_ascii=False, indent=2)
+    return table["version"]
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+def build(characters, questions, workers=DEFAULT_WORKERS, refresh=False, path=FAQ_FILE):
+    """Answer every (character, question) pair missing from the table.
+
+    Answers go into the table and the answer cache. Returns counts and throughput.
+    """
+    existing = {} if refresh else load_answers(path)
+    questions = list(dict.fromkeys(questions))
+    jobs = [(name, question) for name in characters for question in questions
+            if refresh or normalize_question(question) not in existing.get(name, {})]
+    result = {"pairs": len(characters) * len(questions), "answered": 0, "failed": 0,
+              "skipped": len(characters) * len(questions) - len(jobs), "models": {}}
+    pending = {}
+    start_time = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="faq") as pool:
+        # Batch work waits out the rate limit instead of giving up on the first shed
+        futures = {pool.submit(retry_when_busy, answer_question, name, question): (name, question)
+                   for name, question in jobs}
+        for future in as_completed(futures):
+            name, question = futures[future]
+            try:
+                answer, model = future.result()
+            except (Busy, NoModelAvailable) as e:
+                print(f"No answer for {name} / {question}: {str(e)}")
+                result["failed"] += 1
+                continue
+            store(make_key(name, question), answer)
+            pending.setdefault(name, {})[normalize_question(question)] = answer
+            result["answered"] += 1
+            result["models"][model] = result["models"].get(model, 0) + 1
+            if result["answered"] % CHECKPOINT_EVERY == 0:
+                save_answers(pending, path)
+                pending = {}
+
+    if pending:
+        save_answers(pending, path)
+    result["version"] = _read(path).get("version", 0)
+    result["seconds"] = time.perf_counter() - start_time
+    result["answers_per_second"] = result["answered"] / result["seconds"] if result["seconds"] else 0.0
+    return result
+
+
+def _read_questions(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from utils.prompt_store import all_prompts
+    from utils.model_stats import get_usage_stats
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Precompute answers to frequent questions for every character")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Answer every question for every character")
+    build_parser.add_argument("--characters", help="Comma separated names (default: every character with a persona)")
+    build_parser.add_argument("--questions-file", help="One question per line (default: a built-in list)")
+    build_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent Groq requests")
+    build_parser.add_argument("--rpm", type=float, help="Requests per minute for this run (default: GROQ_RPM_LIMIT)")
+    build_parser.add_argument("--tpm", type=float, help="Tokens per minute for this run (default: GROQ_TPM_LIMIT)")
+    build_parser.add_argument("--refresh", action="store_true", help="Answer again pairs that are already in the table")
+    subparsers.add_parser("stats", help="Show what the table holds")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        table = _read(FAQ_FILE)
+        answers = load_answers(FAQ_FILE)
+        state = "current" if table.get("prompt_version") == PROMPT_VERSION else "stale, will be rebuilt"
+        print(f"Version {table.get('version', 0)}, prompt version {table.get('prompt_version')} ({state}), "
+              f"updated {table.get('updated_at', '-')}")
+        print(f"{len(answers)} characters, {sum(len(entries) for entries in answers.values())} answers")
+        raise SystemExit(0)
+
+    # The live app has its own limiter, so leave it room by giving this run a share of the account limits
+    if args.rpm:
+        os.environ["GROQ_RPM_LIMIT"] = str(args.rpm)
+    if args.tpm:
+        os.environ["GROQ_TPM_LIMIT"] = str(args.tpm)
+    # Every worker queues under the same background session
+    os.environ["GROQ_ADMISSION_PER_SESSION"] = str(args.workers)
+
+    characters = args.characters.split(',') if args.characters else sorted(all_prompts())
+    questions = _read_questions(args.questions_file) if args.questions_file else DEFAULT_QUESTIONS
+    print(f"Answering {len(questions)} questions for {len(characters)} characters with {args.workers} workers")
+    result = build(characters, questions, args.workers, args.refresh)
+    usage = get_usage_stats()
+    print(f"Answered {result['answered']}, skipped {result['skipped']}, failed {result['failed']} "
+          f"in {result['seconds']:.1f}s ({result['answers_per_second']:.2f}/s); table version {result['version']}")
+    print(f"Tokens: {sum(entry['prompt_tokens'] for entry in usage.values())} in, "
+          f"{sum(entry['completion_tokens'] for entry in usage.values())} out; models {result['models']}")
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from utils.metrics import span
+from utils.tools import atomic_write
+
+# One outbound HTTP layer for the app: keep-alive sessions per host, default timeouts,
+# retries with jitter and an on-disk cache that revalidates with ETag / Last-Modified
+CACHE_FOLDER = os.path.join('data', 'http_cache')
+DEFAULT_TIMEOUT = (float(os.getenv("HTTP_CONNECT_TIMEOUT", 5)), float(os.getenv("HTTP_READ_TIMEOUT", 15)))
+MAX_RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+RETRY_BACKOFF = 0.5
+MAX_RETRY_AFTER = 10
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))
+# Larger bodies are never cached
+MAX_CACHED_BYTES = 5 * 1024 * 1024
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_sessions = {}
+_stats = {}
+
+
+def _host(url):
+    return urlsplit(url).netloc
+
+
+def get_session(host):
+    """The keep-alive session used for every request to host."""
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+        return session
+
+
+def _record(host, **counts):
+    with _lock:
+        stats = _stats.get(host)
+        if stats is None:
+            stats = _stats[host] = {"requests": 0, "errors": 0, "retries": 0, "cache_hits": 0,
+                                    "not_modified": 0, "seconds": 0.0}
+        for key, value in counts.items():
+            stats[key] += value
+
+
+def _retry_delay(attempt, response=None):
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_RETRY_AFTER)
+    return RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def request(method, url, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES, **kwargs):
+    """Send a request on the host's pooled session, retrying connection errors and 429/5xx."""
+    host = _host(url)
+    session = get_session(host)
+    # Only requests that are safe to repeat are retried
+    retries = retries if method.upper() in ('GET', 'HEAD') else 0
+    for attempt in range(retries + 1):
+        start_time = time.perf_counter()
+        try:
+            with span("http_request", host=host):
+                response = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            _record(host, requests=1, errors=1, seconds=time.perf_counter() - start_time)
+            if attempt == retries:
+                raise
+            _record(host, retries=1)
+            time.sleep(_retry_delay(attempt))
+            continue
+        _record(host, requests=1, seconds=time.perf_counter() - start_time)
+        if response.status_code not in RETRY_STATUSES or attempt == retries:
+            if response.status_code >= 400:
+                _record(host, errors=1)
+            return response
+        _record(host, retries=1)
+        response.close()
+        time.sleep(_retry_delay(attempt, response))
+
+
+def _cache_paths(url):
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_FOLDER, digest + '.json'), os.path.join(CACHE_FOLDER, digest + '.body')
+
+
+def _write(path, data):
+    with atomic_write(path, 'wb') as f:
+        f.write(data)
+
+
+def _cache_control(headers):
+    directives = {}
+    for part in headers.get('Cache-Control', '').split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+def _freshness(headers):
+    """Seconds the response may be reused without revalidation."""
+    directives = _cache_control(headers)
+    if 'no-cache' in directives:
+        return 0
+    for name in ('s-maxage', 'max-age'):
+        if directives.get(name, '').isdigit():
+            return int(directives[name])
+    expires, date = headers.get('Expires'), headers.get('Date')
+    if expires and date:
+        try:
+            return max(0, (parsedate_to_datetime(expires) - parsedate_to_datetime(date)).total_seconds())
+        except (TypeError, ValueError):
+            return 0
+    return 0
+
+
+def _load_cached(url):
+    meta_path, body_path = _cache_paths(url)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(body_path, 'rb') as f:
+            body = f.read()
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None, None
+    return meta, body
+
+
+def _store_cached(url, response):
+    headers = response.headers
+    if 'no-store' in _cache_control(headers) or len(response.content) > MAX_CACHED_BYTES:
+        return
+    if not (headers.get('ETag') or headers.get('Last-Modified') or _freshness(headers)):
+        return  # nothing to revalidate with and no lifetime: not worth keeping
+    meta_path, body_path = _cache_paths(url)
+    os.makedirs(CACHE_FOLDER, exist_ok=True)
+    meta = {"stored_at": time.time(), "headers": {key: value for key, value in headers.items() if key.lower() != 'set-cookie'}}
+    _write(body_path, response.content)
+    _write(meta_path, json.dumps(meta).encode('utf-8'))
+
+
+def _refresh_cached(url, meta, response):
+    # A 304 carries updated freshness headers; keep the stored body
+    headers = CaseInsensitiveDict(meta["headers"])
+    headers.update({key: value for key, value in response.headers.items()
+                    if key.lower() in ('cache-control', 'expires', 'date', 'etag', 'last-modified')})
+    meta["headers"] = dict(headers)
+    meta["stored_at"] = time.time()
+    _write(_cache_paths(url)[0], json.dumps(meta).encode('utf-8'))
+
+
+def _cached_response(url, meta, body):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = CaseInsensitiveDict(meta["headers"])
+    response._content = body
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+def get(url, cache=True, **kwargs):
+    """GET through the shared client, answering from the local cache while it is fresh.
+
+    Stale entries are revalidated with If-None-Match / If-Modified-Since, so an
+    unchanged resource costs a 304. stream=True responses are never cached.
+    """
+    if not cache or kwargs.get('stream'):
+        return request('GET', url, **kwargs)
+
+    host = _host(url)
+    meta, body = _load_cached(url)
+    headers = dict(kwargs.pop('headers', None) or {})
+    if meta is not None:
+        cached_headers = CaseInsensitiveDict(meta["headers"])
+        if time.time() - meta["stored_at"] < _freshness(cached_headers):
+            _record(host, cache_hits=1)
+            return _cached_response(url, meta, body)
+        if cached_headers.get('ETag'):
+            headers['If-None-Match'] = cached_headers['ETag']
+        if cached_headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = cached_headers['Last-Modified']
+
+    response = request('GET', url, headers=headers, **kwargs)
+    if response.status_code == 304 and meta is not None:
+        _record(host, not_modified=1)
+        try:
+            _refresh_cached(url, meta, response)
+        except OSError as e:
+            print(f"Error updating HTTP cache for {host}: {str(e)}")
+        return _cached_response(url, meta, body)
+    if response.status_code == 200:
+        try:
+            _store_cached(url, response)
+        except OSError as e:
+            print(f"Error writing HTTP cache for {host}: {str(e)}")
+    return response
+
+
+def get_stats():
+    """Per-host request counts, cache results and average latency."""
+    with _lock:
+        stats = {host: dict(counts) for host, counts in _stats.items()}
+    for counts in stats.values():
+        counts["latency_avg"] = counts["seconds"] / counts["requests"] if counts["requests"] else 0.0
+    return stats
@@ -0,0 +1,142 @@
+import os
+import time
+import hashlib
+import threading
+import requests
+from PIL import Image, features
+from utils.metrics import span
+from utils import http_client
+from utils.shared_state import get_backend
+from utils.tools import atomic_write
+
+# Pre-sized derivatives of local and remote images, generated once and kept on disk
+CACHE_FOLDER = os.path.join('data', 'image_cache')
+REMOTE_FOLDER = os.path.join(CACHE_FOLDER, 'remote')
+DERIVATIVE_FOLDER = os.path.join(CACHE_FOLDER, 'derivatives')
+
+DISPLAY_WIDTH = 300
+# Width served for the 300px image slots: twice the display size, so retina screens stay sharp
+SERVE_WIDTH = int(os.getenv("IMAGE_SERVE_WIDTH", DISPLAY_WIDTH * 2))
+# Width served for images stretched across a page column (the header); never upscaled
+COLUMN_WIDTH = int(os.getenv("IMAGE_COLUMN_WIDTH", 1200))
+# Widths generated for each card image: display size, retina size and the served size
+DERIVATIVE_WIDTHS = tuple(sorted({DISPLAY_WIDTH, DISPLAY_WIDTH * 2, SERVE_WIDTH}))
+
+DERIVATIVE_FORMAT, DERIVATIVE_EXTENSION = ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+DERIVATIVE_QUALITY = 80
+
+# Marker used in character_images.json for characters without any image
+MISSING_MARKER = "NOT EXIST"
+FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", 10))
+NEGATIVE_TTL = float(os.getenv("IMAGE_NEGATIVE_TTL", 3600))
+# Remote images that failed are shared with the other workers so they do not retry them
+MISSING_NAMESPACE = 'missing_images'
+
+_lock = threading.Lock()
+_hashes = {}
+_missing = {}
+
+
+def is_remote(source):
+    return isinstance(source, str) and source.startswith(('http://', 'https://'))
+
+
+def fetch_path(url):
+    extension = os.path.splitext(url.split('?')[0])[1] or '.img'
+    return os.path.join(REMOTE_FOLDER, hashlib.sha1(url.encode('utf-8')).hexdigest() + extension)
+
+
+def _is_missing(source):
+    with _lock:
+        expires_at = _missing.get(source)
+        if expires_at is not None:
+            if expires_at > time.time():
+                return True
+            del _missing[source]
+    if not is_remote(source) or os.path.isfile(fetch_path(source)):
+        return False
+    expires_at = get_backend().get(MISSING_NAMESPACE, source)
+    if expires_at is None:
+        return False
+    with _lock:
+        _missing[source] = expires_at
+    return True
+
+
+def mark_missing(source, ttl=NEGATIVE_TTL):
+    expires_at = time.time() + ttl
+    with _lock:
+        _missing[source] = expires_at
+    if is_remote(source):
+        try:
+            get_backend().set(MISSING_NAMESPACE, source, expires_at, ttl=ttl)
+        except Exception as e:
+            print(f"Error sharing missing image {source}: {str(e)}")
+
+
+def fetch_remote(url):
+    """Download a remote image once and return its local path."""
+    local_path = fetch_path(url)
+    if os.path.isfile(local_path):
+        return local_path
+
+    with span("image_fetch"):
+        # Downloaded images are kept on disk by URL, so the HTTP cache would only duplicate them
+        response = http_client.get(url, cache=False, timeout=FETCH_TIMEOUT)
+        response.raise_for_status()
+
+    with atomic_write(local_path, 'wb') as f:
+        f.write(response.content)
+    return local_path
+
+
+def content_hash(path):
+    # Hash each file once per (mtime, size) so unchanged files are not re-read
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if key in _hashes:
+            return _hashes[key]
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    with _lock:
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+
+def derivative_path(digest, width):
+    return os.path.join(DERIVATIVE_FOLDER, f"{digest}_{width}.{DERIVATIVE_EXTENSION}")
+
+
+def build_derivatives(path, widths=DERIVATIVE_WIDTHS):
+    """Create the derivative widths for a local image and return its content hash."""
+    digest = content_hash(path)
+    pending = [width for width in widths if not os.path.isfile(derivative_path(digest, width))]
+    if not pending:
+        return digest
+
+    with span("image_processing"), Image.open(path) as img:
+        img.draft('RGB', (max(pending), max(pending)))
+        img = img.convert('RGBA' if DERIVATIVE_FORMAT == 'WEBP' and 'A' in img.getbands() else 'RGB')
+        for width in sorted(pending, reverse=True):
+            resized = img.copy()
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            with atomic_write(derivative_path(digest, width), 'wb') as f:
+                resized.save(f, DERIVATIVE_FORMAT, quality=DERIVATIVE_QUALITY)
+    return digest
+
+
+def get_display_image(source, width=SERVE_WIDTH):
+    """Return a local copy of a path or URL resized to width, or None if no image exists."""
+    if not source or source == MISSING_MARKER or _is_missing(source):
+        return None
+    try:
+        path = fetch_remote(source) if is_remote(source) else source
+        digest = build_derivatives(path, DERIVATIVE_WIDTHS if width in DERIVATIVE_WIDTHS else (width,))
+    except (requests.RequestException, OSError) as e:
+        print(f"Image {source} unavailable: {str(e)}")
+        mark_missing(source)
+        return None
+    return derivative_path(digest, width)
@@ -1,37 +1,90 @@
 import streamlit as st
 import os
+import re
+import hashlib
+import threading
 
-def initialize():    
-    # Load header content
-    header_file_path = os.path.join('utils', 'header.md')
+# Static page content, read and minified once per process instead of on every rerun
+HEADER_FILE = os.path.join('utils', 'header.md')
+FOOTER_FILE = os.path.join('utils', 'footer.md')
+# Bundled in cascade order: later files override earlier ones
+CSS_FILES = [os.path.join('utils', 'styles.css'), os.path.join('utils', 'page.css')]
+
+_lock = threading.Lock()
+_assets = None
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def _read(path):
     try:
-        with open(header_file_path, 'r', encoding='utf-8') as header_file:
-            header_content = header_file.read()
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
     except FileNotFoundError:
-        st.error("header.md file not found in utils folder.")
+        return None
+
+
+def _build_assets():
+    errors = []
+
+    # Load header content
+    header_content = _read(HEADER_FILE)
+    if header_content is None:
+        errors.append("header.md file not found in utils folder.")
         header_content = ""  # Provide a default empty header
 
     # Extract title and image path from header content
     header_lines = header_content.split('\n')
     title = header_lines[0].strip('# ')
-    image_path = None    
+    image_path = None
     for line in header_lines:
         if line.startswith('!['):
             image_path = line.split('(')[1].split(')')[0]
             break
 
-    # Load external CSS
-    css_file_path = os.path.join('utils', 'styles.css')
-    with open(css_file_path, 'r') as f:
-        st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)    
-    
     # Load footer content
-    footer_file_path = os.path.join('utils', 'footer.md')
-    try:
-        with open(footer_file_path, 'r', encoding='utf-8') as footer_file:
-            footer_content = footer_file.read()
-    except FileNotFoundError:
-        st.error("footer.md file not found in utils folder.")
-        footer_content = ""  # Provide a default empty footer    
+    footer_content = _read(FOOTER_FILE)
+    if footer_content is None:
+        errors.append("footer.md file not found in utils folder.")
+        footer_content = ""  # Provide a default empty footer
+    footer_content = "\n".join(line.rstrip() for line in footer_content.strip().split('\n'))
+
+    # One minified stylesheet for the whole page, identified by its content hash
+    css = minify_css("".join(_read(path) or "" for path in CSS_FILES))
+    bundle_id = hashlib.sha1(css.encode('utf-8')).hexdigest()[:12]
+
+    return {
+        "title": title,
+        "image_path": image_path,
+        "footer": footer_content,
+        "errors": errors,
+        "bundle_id": bundle_id,
+        "style": f'<style id="bundle-{bundle_id}">{css}</style>',
+    }
+
+
+def get_assets():
+    global _assets
+    if _assets is None:
+        with _lock:
+            if _assets is None:
+                _assets = _build_assets()
+    return _assets
+
+
+def initialize():
+    assets = get_assets()
+    for error in assets["errors"]:
+        st.error(error)
+
+    # Streamlit drops elements that a rerun does not emit again, so the bundle goes out
+    # once per rerun as a single element; its stable content lets the browser skip re-applying it
+    st.markdown(assets["style"], unsafe_allow_html=True)
 
-    return title, image_path, footer_content
\ No newline at end of file
+    return assets["title"], assets["image_path"], assets["footer"]
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import bisect
+import threading
+from functools import wraps
+from utils.tools import atomic_write
+
+# Lightweight stage timing; everything is a no-op unless METRICS_ENABLED is set
+ENABLED = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+# One file per worker process; "{pid}" is replaced with the process id
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join('data', 'metrics.{pid}.prom'))
+METRICS_FORMAT = os.getenv("METRICS_FORMAT", "prometheus")
+EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", 15))
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+_exporter = None
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("key", "start_time")
+
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        key = self.key if exc_type is None else self.key + (("error", "1"),)
+        observe(key, time.perf_counter() - self.start_time)
+        return False
+
+
+def observe(key, seconds):
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def _key(name, labels):
+    return (name,) + tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    """Count an event: `increment("character_pool", result="hit")`."""
+    if not ENABLED:
+        return
+    _start_exporter()
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def gauge(name, value, **labels):
+    """Set a current level: `gauge("cartoon_queue_depth", 3)`."""
+    if not ENABLED:
+        return
+    _start_exporter()
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def span(name, **labels):
+    """Time a block: `with span("groq_attempt", model=model): ...`. Failed blocks get an error label."""
+    if not ENABLED:
+        return _NOOP_SPAN
+    _start_exporter()
+    return _Span(_key(name, labels))
+
+
+def record(name, seconds, **labels):
+    """Record a duration measured elsewhere: `record("groq_ttft", seconds, model=model)`."""
+    if not ENABLED:
+        return
+    _start_exporter()
+    observe(_key(name, labels), seconds)
+
+
+def timed(name, **labels):
+    """Decorator form of span()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    """Return every histogram, counter and gauge as a JSON-friendly dict."""
+    with _lock:
+        items = [(key, list(h.counts), h.total, h.count) for key, h in _histograms.items()]
+        counters = list(_counters.items())
+        gauges = list(_gauges.items())
+    return [
+        {
+            "type": "histogram",
+            "name": key[0],
+            "labels": dict(key[1:]),
+            "count": count,
+            "sum": total,
+            "buckets": dict(zip([str(bound) for bound in BUCKETS] + ["+Inf"], counts)),
+        }
+        for key, counts, total, count in items
+    ] + [
+        {"type": "counter", "name": key[0], "labels": dict(key[1:]), "count": count}
+        for key, count in counters
+    ] + [
+        {"type": "gauge", "name": key[0], "labels": dict(key[1:]), "value": value}
+        for key, value in gauges
+    ]
+
+
+def to_prometheus():
+    lines = []
+    for entry in sorted(snapshot(), key=lambda entry: entry["name"]):
+        labels = ",".join(f'{key}="{value}"' for key, value in sorted(entry["labels"].items()))
+        if entry["type"] == "counter":
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"starwars_{entry['name']}_total{suffix} {entry['count']}")
+            continue
+        if entry["type"] == "gauge":
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"starwars_{entry['name']}{suffix} {entry['value']}")
+            continue
+        name = f"starwars_{entry['name']}_seconds"
+        cumulative = 0
+        for bound, count in entry["buckets"].items():
+            cumulative += count
+            bucket_labels = ",".join(filter(None, [labels, f'le="{bound}"']))
+            lines.append(f"{name}_bucket{{{bucket_labels}}} {cumulative}")
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {entry['sum']:.6f}")
+        lines.append(f"{name}_count{suffix} {entry['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def export(path=METRICS_FILE, fmt=METRICS_FORMAT):
+    content = json.dumps(snapshot(), indent=2) if fmt == "json" else to_prometheus()
+    path = path.format(pid=os.getpid())
+    with atomic_write(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def _export_loop():
+    while True:
+        time.sleep(EXPORT_INTERVAL)
+        try:
+            export()
+        except OSError as e:
+            print(f"Error exporting metrics: {str(e)}")
+
+
+def _start_exporter():
+    global _exporter
+    if _exporter is not None:
+        return
+    with _lock:
+        if _exporter is None:
+            _exporter = threading.Thread(target=_export_loop, name="metrics-exporter", daemon=True)
+            _exporter.start()
@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.model_stats import record_attempt, record_usage, latency_percentile
+from utils.metrics import span
+from utils.admission import get_admission, request_cost, Busy
+
+# Routing policy for the Groq models
+ATTEMPT_TIMEOUT = float(os.getenv("GROQ_ATTEMPT_TIMEOUT", 20))
+FAILURE_THRESHOLD = int(os.getenv("GROQ_FAILURE_THRESHOLD", 3))
+COOLDOWN_SECONDS = float(os.getenv("GROQ_COOLDOWN_SECONDS", 30))
+HEDGE_ENABLED = os.getenv("GROQ_HEDGE", "0").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = 95
+ROUTER_WORKERS = int(os.getenv("GROQ_ROUTER_WORKERS", 16))
+
+_executor = ThreadPoolExecutor(max_workers=ROUTER_WORKERS, thread_name_prefix="groq")
+_routers = {}
+_routers_lock = threading.Lock()
+
+
+class NoModelAvailable(Exception):
+    pass
+
+
+class ModelRouter:
+    """Orders models by rolling latency and keeps failing models behind a circuit breaker."""
+
+    def __init__(self, models, attempt_timeout=ATTEMPT_TIMEOUT, failure_threshold=FAILURE_THRESHOLD,
+                 cooldown=COOLDOWN_SECONDS, hedge=HEDGE_ENABLED):
+        self.models = list(models)
+        self.attempt_timeout = attempt_timeout
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self._failures = {model: 0 for model in self.models}
+        self._open_until = {model: 0.0 for model in self.models}
+
+    def candidates(self):
+        """Return healthy models fastest first; if every circuit is open, the one closest to closing."""
+        now = time.time()
+        with self._lock:
+            healthy = [model for model in self.models if self._open_until[model] <= now]
+            if not healthy:
+                return [min(self.models, key=self._open_until.get)]
+        # Models without measurements sort first so they get explored
+        return sorted(healthy, key=lambda model: latency_percentile(model, 50) or 0.0)
+
+    def record_success(self, model, seconds):
+        record_attempt(model, seconds, True)
+        with self._lock:
+            self._failures[model] = 0
+            self._open_until[model] = 0.0
+
+    def record_failure(self, model, seconds):
+        record_attempt(model, seconds, False)
+        with self._lock:
+            self._failures[model] += 1
+            if self._failures[model] >= self.failure_threshold:
+                self._open_until[model] = time.time() + self.cooldown
+                print(f"Circuit open for model {model} for {self.cooldown:.0f}s")
+
+    def admit(self, params, max_wait=None):
+        """Wait for the rate limiter to admit one call; return the tokens reserved. Raises Busy."""
+        return get_admission().acquire(request_cost(params["messages"], params.get("max_tokens", 0)), max_wait=max_wait)
+
+    def _attempt(self, client, model, params, reserved, label):
+        start_time = time.perf_counter()
+        try:
+            with span("groq_attempt", model=model):
+                response = client.chat.completions.create(
+                    model=model, timeout=self.attempt_timeout, stream=False, **params
+                )
+        except Exception:
+            self.record_failure(model, time.perf_counter() - start_time)
+            # A failed call reports no usage, so the reservation would otherwise never be returned
+            get_admission().settle(reserved, 0)
+            raise
+        seconds = time.perf_counter() - start_time
+        self.record_success(model, seconds)
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            record_usage(label, model, usage, seconds)
+            get_admission().settle(reserved, usage.total_tokens)
+        return response
+
+    def complete(self, client, label="other", **params):
+        """Run a non-streaming completion, returning (response, model).
+
+        Token usage is recorded under `label` (see model_stats.get_usage_stats).
+
+        Models are tried in candidate order. With hedging enabled, a second model
+        is started when the current one runs past its p95 latency, and the first
+        successful response wins. Every call goes through admission control first;
+        Busy is raised if the first attempt is shed.
+        """
+        remaining = self.candidates()
+        pending = {}
+        hedging = self.hedge
+
+        def launch(hedge=False):
+            if not remaining:
+                return None
+            try:
+                # A hedge is only worth sending if the limiter has room right now
+                reserved = self.admit(params, max_wait=0 if hedge else None)
+            except Busy:
+                if not hedge:
+                    raise
+                return None
+            model = remaining.pop(0)
+            pending[_executor.submit(self._attempt, client, model, params, reserved, label)] = model
+            return model
+
+        launch()
+        while pending:
+            hedge_after = None
+            if hedging and len(pending) == 1:
+                hedge_after = latency_percentile(next(iter(pending.values())), HEDGE_PERCENTILE)
+            done, _ = wait(pending, timeout=hedge_after, return_when=FIRST_COMPLETED)
+            if not done:
+                if launch(hedge=True) is None:
+                    hedging = False
+                continue
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    return future.result(), model
+                except Exception as e:
+                    print(f"Error with model {model}: {str(e)}. Trying next model.")
+            if not pending:
+                launch()
+
+        raise NoModelAvailable("All Groq models failed")
+
+
+def get_router(models):
+    """Return the process-wide router for this model list."""
+    key = tuple(models)
+    with _routers_lock:
+        if key not in _routers:
+            _routers[key] = ModelRouter(key)
+        return _routers[key]
@@ -0,0 +1,97 @@
+import threading
+from collections import defaultdict, deque
+from utils.metrics import increment, record
+
+# Rolling per-model measurements, kept for the life of the process
+WINDOW_SIZE = 100
+
+_lock = threading.Lock()
+_ttft = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+_latency = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+_outcomes = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+# Token usage per label (the character for chat answers, otherwise the kind of call)
+_usage = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0})
+
+
+def record_ttft(model, seconds):
+    with _lock:
+        _ttft[model].append(seconds)
+    record("groq_ttft", seconds, model=model)
+
+
+def record_attempt(model, seconds, ok):
+    with _lock:
+        _outcomes[model].append(ok)
+        if ok:
+            _latency[model].append(seconds)
+
+
+def record_usage(label, model, usage, seconds):
+    """Record the token counts of a response's usage block (missing usage is ignored)."""
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    with _lock:
+        entry = _usage[label]
+        entry["calls"] += 1
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+        entry["seconds"] += seconds
+    increment("groq_tokens", prompt_tokens, direction="input", model=model)
+    increment("groq_tokens", completion_tokens, direction="output", model=model)
+
+
+def latency_percentile(model, percentile):
+    """Return the given percentile of recent successful latencies, or None without data."""
+    with _lock:
+        samples = sorted(_latency[model])
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+
+def error_rate(model):
+    with _lock:
+        outcomes = list(_outcomes[model])
+    if not outcomes:
+        return 0.0
+    return outcomes.count(False) / len(outcomes)
+
+
+def _summary(samples):
+    return {
+        "count": len(samples),
+        "avg": sum(samples) / len(samples),
+        "last": samples[-1],
+    }
+
+
+def get_ttft_stats():
+    """Return count, average and latest time-to-first-token (seconds) per model."""
+    with _lock:
+        return {model: _summary(samples) for model, samples in _ttft.items() if samples}
+
+
+def get_model_stats():
+    with _lock:
+        models = set(_latency) | set(_outcomes)
+    return {
+        model: {
+            "p50": latency_percentile(model, 50),
+            "p95": latency_percentile(model, 95),
+            "error_rate": error_rate(model),
+        }
+        for model in models
+    }
+
+
+def get_usage_stats():
+    """Return calls, token totals and per-call averages for each label."""
+    with _lock:
+        usage = {label: dict(entry) for label, entry in _usage.items()}
+    for entry in usage.values():
+        entry["avg_prompt_tokens"] = entry["prompt_tokens"] / entry["calls"]
+        entry["avg_completion_tokens"] = entry["completion_tokens"] / entry["calls"]
+        entry["avg_seconds"] = entry["seconds"] / entry["calls"]
+    return usage
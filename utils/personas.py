@@ -0,0 +1,122 @@
+import os
+import re
+import argparse
+import threading
+from utils.prompt_store import get_or_create_prompt, all_prompts, replace_prompt, export_json
+from utils.model_router import get_router
+from utils.resources import get_groq_client, get_groq_models
+from utils.conversation import estimate_tokens
+
+# Personas are sent as input tokens with every question, so they are kept short
+PERSONA_TOKEN_BUDGET = int(os.getenv("PERSONA_TOKEN_BUDGET", 250))
+
+# "Here is a system prompt for a Star Wars chatbot impersonating X:" and similar
+PREAMBLE = re.compile(r"^\s*(here is|here's|below is|sure[,!]?)[^\n]*:\s*\n", re.IGNORECASE)
+# The persona itself, when the model wrapped it in quotes
+QUOTED_PERSONA = re.compile(r'"(You are .*?)"\s*(?:\n|$)', re.DOTALL)
+# Commentary and examples the model adds after the persona
+TRAILER = re.compile(
+    r"\n\s*(this (system )?prompt|the chatbot should|example (tone|response|responses|interaction)s?\b|note:)",
+    re.IGNORECASE,
+)
+# Sentences every persona ends with that add nothing to the answer
+BOILERPLATE = [
+    re.compile(r"\s*May the Force be with you[^.!?\"]*[.!?]*", re.IGNORECASE),
+    re.compile(r"\s*Now,? respond to the user'?s? (inquiry|query|question)[^\n]*", re.IGNORECASE),
+    re.compile(r"\s*How can you help me[^?]*\?", re.IGNORECASE),
+]
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+_lock = threading.Lock()
+_migrated = False
+
+
+def compact_persona(text, token_budget=PERSONA_TOKEN_BUDGET):
+    """Strip the LLM preamble, commentary and stock phrases, then cut to the token budget."""
+    text = PREAMBLE.sub("", text.strip(), count=1)
+    quoted = QUOTED_PERSONA.search(text)
+    if quoted:
+        text = quoted.group(1)
+    else:
+        trailer = TRAILER.search(text)
+        if trailer:
+            text = text[:trailer.start()]
+    for pattern in BOILERPLATE:
+        text = pattern.sub("", text)
+
+    # Keep whole sentences (and list items), dropping repeats, until the budget is used
+    kept, seen, used = [], set(), 0
+    for sentence in SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        key = sentence.lower().strip('*-• ')
+        if not key or key in seen:
+            continue
+        cost = estimate_tokens(sentence)
+        if kept and used + cost > token_budget:
+            break
+        seen.add(key)
+        kept.append(sentence)
+        used += cost
+    # List items stay on their own lines
+    return "".join(("\n" if sentence[0] in "*-•" else " ") + sentence for sentence in kept).strip()
+
+
+def generate_character_prompt(character_name):
+    # Ask Groq to create a prompt in English
+    system_prompt = f"Create a system prompt for a Star Wars chatbot impersonating {character_name}. The prompt should capture the character's personality, speech patterns, and key traits in at most {PERSONA_TOKEN_BUDGET * 3 // 5} words. The response should be in English, contain only the prompt itself and start with 'You are {character_name}...'"
+
+    response, _ = get_router(get_groq_models()).complete(
+        get_groq_client(),
+        label="persona",
+        messages=[
+            {"role": "system", "content": "You are an expert on Star Wars characters and their personalities."},
+            {"role": "user", "content": system_prompt},
+        ],
+        temperature=0.0,
+        max_tokens=int(os.getenv("GROQ_MAX_TOKENS", 1024)),
+    )
+
+    return compact_persona(response.choices[0].message.content)
+
+
+def migrate_stored_personas():
+    """Compact every stored persona that is not compact yet; return the number changed."""
+    changed = 0
+    for name, prompt in all_prompts().items():
+        compacted = compact_persona(prompt)
+        if compacted and compacted != prompt:
+            replace_prompt(name, compacted)
+            changed += 1
+    return changed
+
+
+def _migrate_once():
+    global _migrated
+    if _migrated:
+        return
+    with _lock:
+        if not _migrated:
+            # Personas stored before compaction existed are compacted on first use
+            migrate_stored_personas()
+            _migrated = True
+
+
+def get_or_create_character_prompt(character_name):
+    _migrate_once()
+    # Concurrent requests for a missing persona wait on a single generation
+    return get_or_create_prompt(character_name, generate_character_prompt)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the stored character personas")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Compact every stored persona and update character_prompts.json")
+    compact_parser.add_argument("--dry-run", action="store_true", help="Only report the token savings")
+    args = parser.parse_args()
+
+    prompts = all_prompts()
+    before = sum(estimate_tokens(prompt) for prompt in prompts.values())
+    after = sum(estimate_tokens(compact_persona(prompt)) for prompt in prompts.values())
+    print(f"Personas: {len(prompts)}, estimated tokens {before} -> {after}")
+    if not args.dry_run:
+        print(f"Compacted {migrate_stored_personas()} personas, exported {export_json()}")
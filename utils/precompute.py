@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from utils.catalog import get_catalog, get_character
+from utils.translation_cache import translate_many, character_vocabulary, get_cached
+from utils.image_cache import get_display_image
+from utils.cartoon_generator import ensure_cartoon, cartoon_path, set_workers, CARTOON_WORKERS
+from utils.prompt_store import get_prompt, export_json
+from utils.personas import get_or_create_character_prompt
+from utils.resources import character_image_source
+from utils.admission import retry_when_busy
+
+# Generates every per-character artifact ahead of time so no user request has to:
+#   python -m utils.precompute [--tasks personas,cartoons] [--ids 1-88]
+DATA_FOLDER = 'data'
+JOURNAL_FILE = os.path.join(DATA_FOLDER, 'precompute_journal.jsonl')
+
+TASKS = ('translations', 'images', 'cartoons', 'personas')
+# Default concurrency per remote service
+DEFAULT_WORKERS = {'translations': 4, 'images': 4, 'cartoons': CARTOON_WORKERS, 'personas': 2}
+
+
+def _translated(char):
+    return all(get_cached(text) is not None for text in character_vocabulary(char))
+
+
+def _has_cartoon(char):
+    return os.path.isfile(cartoon_path(char.get('name')))
+
+
+def _has_persona(char):
+    return get_prompt(char.get('name')) is not None
+
+
+def _translate(char):
+    translate_many(character_vocabulary(char))
+
+
+def _image(char):
+    if not get_display_image(character_image_source(char.get('image'), char.get('id'))):
+        raise Exception(f"No image for {char.get('name')}")
+
+
+def _cartoon(char):
+    # Same work as main's cartoon stage, including the resized copies
+    name = char.get('name')
+    get_display_image(ensure_cartoon(name, name))
+
+
+def _persona(char):
+    # Wait out the rate limit instead of journaling the character as failed
+    retry_when_busy(get_or_create_character_prompt, char.get('name'))
+
+
+# task -> (already done?, produce); images are always re-checked since the cache is cheap to hit
+HANDLERS = {
+    'translations': (_translated, _translate),
+    'images': (lambda char: False, _image),
+    'cartoons': (_has_cartoon, _cartoon),
+    'personas': (_has_persona, _persona),
+}
+
+
+class Journal:
+    """Append-only record of finished (id, task) pairs, so an interrupted run can resume."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done = set()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by a crash
+                    if entry.get("status") in ("done", "skipped"):
+                        self.done.add((entry["id"], entry["task"]))
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, char_id, task, status, seconds=0.0, error=None):
+        entry = {"id": char_id, "task": task, "status": status, "seconds": round(seconds, 3), "time": time.time()}
+        if error:
+            entry["error"] = error
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            if status in ("done", "skipped"):
+                self.done.add((char_id, task))
+
+    def close(self):
+        self._file.close()
+
+
+class Progress:
+    def __init__(self, tasks):
+        self._lock = threading.Lock()
+        self.counts = {task: {"done": 0, "skipped": 0, "failed": 0, "seconds": 0.0} for task in tasks}
+        self.start_time = time.perf_counter()
+
+    def add(self, task, status, seconds=0.0):
+        with self._lock:
+            self.counts[task][status] += 1
+            self.counts[task]["seconds"] += seconds
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start_time
+        print(f"Elapsed: {elapsed:.1f}s")
+        for task, counts in self.counts.items():
+            rate = counts["done"] / elapsed if elapsed else 0.0
+            average = counts["seconds"] / counts["done"] if counts["done"] else 0.0
+            print(f"  {task:<13} done {counts['done']:>3}  skipped {counts['skipped']:>3}  "
+                  f"failed {counts['failed']:>3}  {rate:.2f}/s  avg {average:.2f}s")
+
+
+def _run_task(task, char_id, char, journal, progress):
+    is_done, produce = HANDLERS[task]
+    try:
+        if is_done(char):
+            journal.record(char_id, task, "skipped")
+            progress.add(task, "skipped")
+            return
+        start_time = time.perf_counter()
+        produce(char)
+        seconds = time.perf_counter() - start_time
+    except Exception as e:
+        print(f"{task} failed for {char_id} ({char.get('name')}): {str(e)}")
+        journal.record(char_id, task, "failed", error=str(e))
+        progress.add(task, "failed")
+        return
+    journal.record(char_id, task, "done", seconds)
+    progress.add(task, "done", seconds)
+
+
+def precompute(ids, tasks=TASKS, workers=None, journal_path=JOURNAL_FILE):
+    workers = dict(DEFAULT_WORKERS, **(workers or {}))
+    journal = Journal(journal_path)
+    progress = Progress(tasks)
+    if 'cartoons' in tasks:
+        # Cartoons run on the generator's own queue; size it to match this run
+        set_workers(workers['cartoons'])
+    # One bounded pool per service, so a slow generator never starves the others
+    pools = {task: ThreadPoolExecutor(max_workers=workers[task], thread_name_prefix=f"precompute-{task}")
+             for task in tasks}
+    futures = []
+    try:
+        for char_id in ids:
+            pending = [task for task in tasks if (char_id, task) not in journal.done]
+            for task in tasks:
+                if task not in pending:
+                    progress.add(task, "skipped")
+            if not pending:
+                continue
+            try:
+                char = get_character(char_id)
+            except Exception as e:
+                print(f"Could not load character {char_id}: {str(e)}")
+                char = None
+            if not char:
+                for task in pending:
+                    journal.record(char_id, task, "failed", error="character not found")
+                    progress.add(task, "failed")
+                continue
+            for task in pending:
+                futures.append(pools[task].submit(_run_task, task, char_id, char, journal, progress))
+        wait(futures)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+        journal.close()
+    return progress
+
+
+def _parse_ids(value):
+    ids = []
+    for part in value.split(','):
+        if '-' in part:
+            first, last = part.split('-', 1)
+            ids.extend(range(int(first), int(last) + 1))
+        elif part:
+            ids.append(int(part))
+    return ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate personas, cartoons, images and translations for every character")
+    parser.add_argument("--ids", type=_parse_ids, help="Ids or ranges, e.g. 1-20,42 (default: the whole catalog)")
+    parser.add_argument("--tasks", default=",".join(TASKS), help=f"Comma separated subset of {','.join(TASKS)}")
+    for task, count in DEFAULT_WORKERS.items():
+        parser.add_argument(f"--{task}-workers", type=int, default=count, help=f"Concurrent {task} requests")
+    parser.add_argument("--journal", default=JOURNAL_FILE, help="Progress journal used to resume")
+    parser.add_argument("--restart", action="store_true", help="Ignore the journal and check every artifact again")
+    parser.add_argument("--no-export", action="store_true", help="Do not write the personas back to character_prompts.json")
+    args = parser.parse_args()
+
+    tasks = [task for task in args.tasks.split(',') if task]
+    unknown = set(tasks) - set(TASKS)
+    if unknown:
+        parser.error(f"Unknown tasks: {', '.join(sorted(unknown))}")
+    if args.restart and os.path.exists(args.journal):
+        os.remove(args.journal)
+
+    # Every persona worker queues for admission under the same background session
+    if 'personas' in tasks:
+        os.environ["GROQ_ADMISSION_PER_SESSION"] = str(max(args.personas_workers,
+                                                           int(os.getenv("GROQ_ADMISSION_PER_SESSION", 2))))
+
+    ids = args.ids or get_catalog().ids
+    print(f"Precomputing {', '.join(tasks)} for {len(ids)} characters")
+    progress = precompute(ids, tasks, {task: getattr(args, f"{task}_workers") for task in tasks}, args.journal)
+    progress.report()
+    if 'personas' in tasks and not args.no_export:
+        print(f"Exported {export_json()} personas to the seed file")
@@ -0,0 +1,125 @@
+import os
+import json
+import sqlite3
+import threading
+from concurrent.futures import Future
+from utils.metrics import span
+from utils.shared_state import get_backend
+from utils.tools import atomic_write
+
+# Character persona prompts, kept in the shared state backend and seeded from character_prompts.json
+DATA_FOLDER = 'data'
+CHARACTER_PROMPTS_FILE = os.path.join(DATA_FOLDER, 'character_prompts.json')
+# Where prompts lived before the shared backend; imported once if present
+LEGACY_DB_FILE = os.path.join(DATA_FOLDER, 'character_prompts.db')
+NAMESPACE = 'personas'
+
+_lock = threading.Lock()
+_prompts = None
+_prompts_generation = None
+_in_flight = {}
+
+
+def _seed_prompts():
+    seed = {}
+    if os.path.isfile(LEGACY_DB_FILE):
+        try:
+            with sqlite3.connect(LEGACY_DB_FILE) as connection:
+                seed.update(connection.execute("SELECT name, prompt FROM prompts"))
+        except sqlite3.Error as e:
+            print(f"Error reading {LEGACY_DB_FILE}: {str(e)}")
+    try:
+        with open(CHARACTER_PROMPTS_FILE, 'r', encoding='utf-8') as file:
+            seed.update(json.load(file))
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return seed
+
+
+def _load():
+    global _prompts, _prompts_generation
+    backend = get_backend()
+    generation = backend.generation(NAMESPACE)
+    if _prompts is None or generation != _prompts_generation:
+        with _lock:
+            if _prompts is None:
+                # Prompts already stored (possibly by another worker) are never overwritten by the seed
+                for name, prompt in _seed_prompts().items():
+                    backend.add(NAMESPACE, name, prompt)
+            if _prompts is None or generation != _prompts_generation:
+                _prompts = dict(backend.items(NAMESPACE))
+                _prompts_generation = generation
+    return _prompts
+
+
+def get_prompt(character_name):
+    prompts = _load()
+    prompt = prompts.get(character_name)
+    if prompt is None:
+        # Another worker process may have created it since we loaded
+        prompt = get_backend().get(NAMESPACE, character_name)
+        if prompt is not None:
+            prompts[character_name] = prompt
+    return prompt
+
+
+def save_prompt(character_name, prompt):
+    """Store a prompt unless another writer got there first; return the stored prompt."""
+    backend = get_backend()
+    backend.add(NAMESPACE, character_name, prompt)
+    stored = backend.get(NAMESPACE, character_name)
+    _load()[character_name] = stored
+    return stored
+
+
+def all_prompts():
+    _load()
+    return dict(get_backend().items(NAMESPACE))
+
+
+def replace_prompt(character_name, prompt):
+    """Overwrite a stored prompt (used by migrations; new prompts go through save_prompt)."""
+    backend = get_backend()
+    backend.set(NAMESPACE, character_name, prompt)
+    _load()[character_name] = prompt
+    # Other workers reload their copy on their next lookup
+    backend.invalidate(NAMESPACE)
+
+
+def export_json(path=CHARACTER_PROMPTS_FILE):
+    """Write every stored prompt to the JSON seed file so a deployment can ship them."""
+    prompts = dict(sorted(all_prompts().items()))
+    with atomic_write(path, 'w', encoding='utf-8') as file:
+        json.dump(prompts, file, ensure_ascii=False, indent=2)
+    return len(prompts)
+
+
+def get_or_create_prompt(character_name, generate):
+    """Return the stored prompt, calling generate(character_name) at most once per process if missing."""
+    with span("persona_lookup"):
+        prompt = get_prompt(character_name)
+    if prompt is not None:
+        return prompt
+
+    with _lock:
+        future = _in_flight.get(character_name)
+        owner = future is None
+        if owner:
+            future = _in_flight[character_name] = Future()
+
+    if not owner:
+        return future.result()
+
+    try:
+        prompt = get_prompt(character_name)
+        if prompt is None:
+            with span("persona_generation"):
+                prompt = save_prompt(character_name, generate(character_name))
+        future.set_result(prompt)
+        return prompt
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            del _in_flight[character_name]
@@ -0,0 +1,44 @@
+import os
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, Future
+from utils.metrics import timed
+
+# Bounded pool shared by every session for the blocking stages of a render
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", 8))
+
+# func may return a concurrent Future for work queued elsewhere (e.g. the cartoon queue);
+# it is awaited without holding a render thread, then finish(result) runs on the pool
+Stage = namedtuple("Stage", ["name", "func", "args", "timeout", "finish"], defaults=(None,))
+
+_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+
+
+async def run_stage(stage):
+    """Run a blocking stage on the pool and return (name, result, error)."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + stage.timeout
+    try:
+        future = loop.run_in_executor(_executor, timed("render_stage", stage=stage.name)(stage.func), *stage.args)
+        result = await asyncio.wait_for(future, stage.timeout)
+        if isinstance(result, Future):
+            # Shielded so a timeout here never cancels a job other sessions may share
+            result = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(result)), deadline - loop.time())
+        if stage.finish is not None:
+            future = loop.run_in_executor(_executor, stage.finish, result)
+            result = await asyncio.wait_for(future, deadline - loop.time())
+        return stage.name, result, None
+    except Exception as e:
+        # On timeout the worker keeps running; its result is picked up on a later rerun
+        return stage.name, None, e
+
+
+async def render_progressively(stages, on_ready):
+    """Run all stages concurrently and call on_ready(name, result, error) as each one finishes.
+
+    on_ready is called from the script thread, so it may use Streamlit elements.
+    """
+    tasks = [asyncio.ensure_future(run_stage(stage)) for stage in stages]
+    for next_done in asyncio.as_completed(tasks):
+        name, result, error = await next_done
+        on_ready(name, result, error)
@@ -0,0 +1,50 @@
+import os
+import json
+import threading
+
+# Heavy clients and static data, created on first use and shared for the life of the process
+DATA_FOLDER = 'data'
+CHARACTER_IMAGES_FILE = os.path.join(DATA_FOLDER, 'character_images.json')
+
+_lock = threading.Lock()
+_resources = {}
+
+
+def get_resource(name, factory):
+    if name not in _resources:
+        with _lock:
+            if name not in _resources:
+                _resources[name] = factory()
+    return _resources[name]
+
+
+def _create_groq_client():
+    import groq
+    return groq.Groq(api_key=os.getenv("GROQ_API_KEY"))
+
+
+def get_groq_client():
+    return get_resource("groq_client", _create_groq_client)
+
+
+def get_groq_models():
+    # Read on use so a .env loaded after import still applies
+    return os.getenv("GROQ_MODEL", "llama-3.1-70b-versatile").split(",")
+
+
+def _load_character_images():
+    try:
+        with open(CHARACTER_IMAGES_FILE, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f"Error loading character_images.json: {str(e)}")
+        return {}
+
+
+def get_character_images():
+    return get_resource("character_images", _load_character_images)
+
+
+def character_image_source(image, char_id):
+    """The character's image URL, preferring the local override list."""
+    return get_character_images().get(str(int(char_id)), image)
@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from urllib.parse import urlsplit
+
+# State shared by every worker process: answers, personas, translations, counters.
+# STATE_BACKEND picks the store; the default is a local SQLite file, which works for
+# several Streamlit workers on one host. A networked key-value store can be plugged in
+# with register_backend() by implementing StateBackend.
+DATA_FOLDER = 'data'
+STATE_BACKEND = os.getenv("STATE_BACKEND", f"sqlite:///{os.path.join(DATA_FOLDER, 'state.db')}")
+# How often a process checks whether another one invalidated a namespace
+INVALIDATION_CHECK_INTERVAL = float(os.getenv("STATE_INVALIDATION_CHECK_INTERVAL", 2))
+
+_lock = threading.Lock()
+_backend = None
+_factories = {}
+
+
+class StateBackend(ABC):
+    """Namespaced key-value store with TTLs. Values are anything json can encode.
+
+    Every namespace has a generation number; invalidate() bumps it, and processes
+    that keep a memory copy of a namespace drop it when they see a new generation.
+    """
+
+    @abstractmethod
+    def get(self, namespace, key):
+        """The value, or None if the key is missing or expired."""
+
+    @abstractmethod
+    def set(self, namespace, key, value, ttl=None):
+        """Store the value, expiring after ttl seconds when given."""
+
+    @abstractmethod
+    def add(self, namespace, key, value, ttl=None):
+        """Set the key only if it is absent (or expired); return True if this call stored it."""
+
+    @abstractmethod
+    def delete(self, namespace, key):
+        """Remove the key if present."""
+
+    @abstractmethod
+    def incr(self, namespace, key, amount=1):
+        """Atomically add to an integer value (missing counts as 0) and return the new value."""
+
+    @abstractmethod
+    def items(self, namespace):
+        """Every live (key, value) pair in the namespace."""
+
+    @abstractmethod
+    def prune(self, namespace, max_entries):
+        """Drop expired entries, then the least recently written beyond max_entries; return the count."""
+
+    @abstractmethod
+    def invalidate(self, namespace, clear=False):
+        """Bump the namespace generation so other processes drop their memory copies."""
+
+    @abstractmethod
+    def current_generation(self, namespace):
+        """The namespace generation as stored, read on every call."""
+
+    def generation(self, namespace):
+        """current_generation(), re-read at most every INVALIDATION_CHECK_INTERVAL seconds."""
+        now = time.monotonic()
+        cache = self.__dict__.setdefault('_generations', {})
+        cached = cache.get(namespace)
+        if cached is None or now - cached[1] >= INVALIDATION_CHECK_INTERVAL:
+            cached = cache[namespace] = (self.current_generation(namespace), now)
+        return cached[0]
+
+
+class SQLiteBackend(StateBackend):
+    """One SQLite file (WAL mode) shared by the processes on a host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        # One connection per thread; SQLite serializes writers across processes
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                "expires_at REAL, updated_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_updated_at ON entries (namespace, updated_at)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS generations (namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _expires_at(ttl):
+        return time.time() + ttl if ttl else None
+
+    def get(self, namespace, key):
+        row = self._connect().execute(
+            "SELECT value FROM entries WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace, key, value, ttl=None):
+        connection = self._connect()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), self._expires_at(ttl), time.time()),
+            )
+
+    def set_many(self, namespace, items, ttl=None):
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(namespace, key, json.dumps(value, ensure_ascii=False), self._expires_at(ttl), now)
+                 for key, value in items],
+            )
+
+    def add(self, namespace, key, value, ttl=None):
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key = ? AND expires_at <= ?", (namespace, key, now)
+            )
+            return connection.execute(
+                "INSERT OR IGNORE INTO entries (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), self._expires_at(ttl), now),
+            ).rowcount == 1
+
+    def delete(self, namespace, key):
+        connection = self._connect()
+        with connection:
+            connection.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def incr(self, namespace, key, amount=1):
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.execute(
+                "INSERT INTO entries (namespace, key, value, expires_at, updated_at) VALUES (?, ?, ?, NULL, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET "
+                "value = CAST(entries.value AS INTEGER) + excluded.value, updated_at = excluded.updated_at",
+                (namespace, key, str(int(amount)), now),
+            )
+            value = connection.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()[0]
+        return int(value)
+
+    def items(self, namespace):
+        rows = self._connect().execute(
+            "SELECT key, value FROM entries WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time()),
+        )
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def prune(self, namespace, max_entries):
+        connection = self._connect()
+        with connection:
+            removed = connection.execute(
+                "DELETE FROM entries WHERE namespace = ? AND expires_at <= ?", (namespace, time.time())
+            ).rowcount
+            overflow = connection.execute(
+                "SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,)
+            ).fetchone()[0] - max_entries
+            if overflow > 0:
+                removed += connection.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key IN "
+                    "(SELECT key FROM entries WHERE namespace = ? ORDER BY updated_at LIMIT ?)",
+                    (namespace, namespace, overflow),
+                ).rowcount
+        return removed
+
+    def invalidate(self, namespace, clear=False):
+        connection = self._connect()
+        with connection:
+            if clear:
+                connection.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+            connection.execute(
+                "INSERT INTO generations (namespace, generation) VALUES (?, 1) "
+                "ON CONFLICT (namespace) DO UPDATE SET generation = generation + 1",
+                (namespace,),
+            )
+
+    def current_generation(self, namespace):
+        row = self._connect().execute(
+            "SELECT generation FROM generations WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+
+def _sqlite_backend(url):
+    # sqlite:///relative/path.db or sqlite:////absolute/path.db
+    return SQLiteBackend(urlsplit(url).path[1:])
+
+
+def register_backend(scheme, factory):
+    """Make STATE_BACKEND=<scheme>://... create its backend with factory(url)."""
+    _factories[scheme] = factory
+
+
+register_backend("sqlite", _sqlite_backend)
+
+
+def create_backend(url):
+    scheme = urlsplit(url).scheme
+    if scheme not in _factories:
+        raise ValueError(f"No state backend registered for '{scheme}://'")
+    return _factories[scheme](url)
+
+
+def get_backend():
+    """Return the process-wide backend chosen by STATE_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = create_backend(STATE_BACKEND)
+    return _backend
+
+
+def set_many(backend, namespace, items, ttl=None):
+    """Batch set on backends that support it, one set() per item otherwise."""
+    if hasattr(backend, 'set_many'):
+        backend.set_many(namespace, items, ttl)
+        return
+    for key, value in items:
+        backend.set(namespace, key, value, ttl)
+
+
+def _selftest_worker(url, worker, rounds, results):
+    backend = create_backend(url)
+    won = 0
+    for index in range(rounds):
+        backend.incr("selftest", "counter")
+        if backend.add("selftest", f"claim-{index}", worker):
+            won += 1
+        backend.set("selftest", f"worker-{worker}", index)
+    results.put((worker, won, backend.current_generation("selftest")))
+
+
+def selftest(url=STATE_BACKEND, workers=4, rounds=200):
+    """Run N worker processes against one backend and check that no update is lost."""
+    import multiprocessing
+
+    backend = create_backend(url)
+    backend.invalidate("selftest", clear=True)
+    generation = backend.current_generation("selftest")
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=_selftest_worker, args=(url, worker, rounds, results))
+                 for worker in range(workers)]
+    start_time = time.perf_counter()
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start_time
+
+    counter = backend.get("selftest", "counter")
+    claims = sum(won for _, won, _ in outcomes)
+    failures = []
+    if counter != workers * rounds:
+        failures.append(f"counter is {counter}, expected {workers * rounds}")
+    if claims != rounds:
+        failures.append(f"{claims} claims won, expected exactly {rounds}")
+    if any(seen != generation for _, _, seen in outcomes):
+        failures.append("a worker saw a different generation")
+    backend.invalidate("selftest", clear=True)
+    if backend.current_generation("selftest") != generation + 1:
+        failures.append("invalidation did not bump the generation")
+
+    operations = workers * rounds * 3
+    print(f"{workers} workers x {rounds} rounds: {operations} operations in {elapsed:.2f}s "
+          f"({operations / elapsed:.0f}/s)")
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    return not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and test the shared state backend")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    test_parser = subparsers.add_parser("selftest", help="Run worker processes against one backend")
+    test_parser.add_argument("--workers", type=int, default=4)
+    test_parser.add_argument("--rounds", type=int, default=200)
+    invalidate_parser = subparsers.add_parser("invalidate", help="Make every process drop its copy of a namespace")
+    invalidate_parser.add_argument("namespace")
+    invalidate_parser.add_argument("--clear", action="store_true", help="Also delete the stored entries")
+    args = parser.parse_args()
+
+    if args.command == "selftest":
+        raise SystemExit(0 if selftest(workers=args.workers, rounds=args.rounds) else 1)
+    get_backend().invalidate(args.namespace, args.clear)
+    print(f"Invalidated {args.namespace}")
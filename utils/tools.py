@@ -1,6 +1,7 @@
 import os
+import threading
 from io import BytesIO
-import requests
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -27,11 +28,31 @@ def save_uploaded_file(uploaded_file, upload_dir="uploads", filename=None):
     
     return file_path
 
+@contextmanager
+def atomic_write(path, mode="w", **open_args):
+    """
+    Open a temporary file next to path; it replaces path only if the block succeeds,
+    so readers in any process see either the old file or the complete new one.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode, **open_args) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
 def get_image_url(query):
+    # Imported here because http_client itself writes its cache with atomic_write
+    from utils import http_client
+
     UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
 
     url = f"https://api.unsplash.com/search/photos?query={query}&client_id={UNSPLASH_ACCESS_KEY}"
-    response = requests.get(url)
+    # Search results rarely change; the shared client caches and revalidates them
+    response = http_client.get(url)
     data = response.json()
     if data['results']:
         return data['results'][0]['urls']['regular']
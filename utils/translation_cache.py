@@ -0,0 +1,163 @@
+import os
+import json
+import argparse
+import threading
+from collections import OrderedDict
+from utils.metrics import span
+from utils.shared_state import get_backend, set_many
+
+# Persistent translations keyed by (target language, source text), in the shared state backend
+NAMESPACE = 'translations'
+DATA_FOLDER = 'data'
+# Where translations lived before the shared backend; imported once if present
+TRANSLATIONS_FILE = os.path.join(DATA_FOLDER, 'translations.json')
+DEFAULT_TARGET = 'iw'
+MEMORY_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 1024))
+
+# Character attributes that go through the translator
+TRANSLATED_KEYS = ('species', 'gender', 'hairColor', 'eyeColor', 'skinColor')
+
+# Optional override of the Google Translate endpoint (used by the benchmark stand-ins)
+TRANSLATE_URL = os.getenv("GOOGLE_TRANSLATE_URL")
+
+# Line separator used to send several texts in one translator request
+BATCH_SEPARATOR = '\n'
+
+_lock = threading.Lock()
+_memory = OrderedDict()
+_memory_generation = None
+_imported = False
+_translators = {}
+
+
+def _normalize(text):
+    return str(text).strip()
+
+
+def _storage_key(target, text):
+    return f"{target}:{text}"
+
+
+def _import_file(backend):
+    global _imported
+    _imported = True
+    try:
+        with open(TRANSLATIONS_FILE, 'r', encoding='utf-8') as f:
+            translations = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return
+    # The first process to get here imports the file for everyone
+    if backend.add('migrations', TRANSLATIONS_FILE, True):
+        for target, entries in translations.items():
+            set_many(backend, NAMESPACE, [(_storage_key(target, text), value) for text, value in entries.items()])
+
+
+def _sync_memory(backend):
+    global _memory_generation
+    if not _imported:
+        _import_file(backend)
+    generation = backend.generation(NAMESPACE)
+    if generation != _memory_generation:
+        _memory.clear()
+        _memory_generation = generation
+
+
+def _remember(key, value):
+    _memory[key] = value
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_CACHE_SIZE:
+        _memory.popitem(last=False)
+
+
+def get_cached(text, target=DEFAULT_TARGET):
+    key = (target, _normalize(text))
+    backend = get_backend()
+    with _lock:
+        _sync_memory(backend)
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    value = backend.get(NAMESPACE, _storage_key(*key))
+    if value is not None:
+        with _lock:
+            _remember(key, value)
+    return value
+
+
+def _get_translator(target):
+    if target not in _translators:
+        from deep_translator import GoogleTranslator
+        translator = GoogleTranslator(source='auto', target=target)
+        if TRANSLATE_URL:
+            translator._base_url = TRANSLATE_URL
+        _translators[target] = translator
+    return _translators[target]
+
+
+def _translate_batch(texts, target):
+    translator = _get_translator(target)
+    if len(texts) == 1:
+        with span("translation"):
+            return [translator.translate(texts[0])]
+
+    # One request for the whole batch; fall back to per-text calls if the lines got merged
+    with span("translation"):
+        result = translator.translate(BATCH_SEPARATOR.join(texts))
+    lines = [line.strip() for line in (result or '').split(BATCH_SEPARATOR)]
+    if len(lines) == len(texts):
+        return lines
+    translations = []
+    for text in texts:
+        with span("translation"):
+            translations.append(translator.translate(text))
+    return translations
+
+
+def translate_many(texts, target=DEFAULT_TARGET):
+    """Translate texts, sending every cache miss in a single batched request."""
+    texts = [_normalize(text) for text in texts if text and _normalize(text)]
+    results = {text: get_cached(text, target) for text in texts}
+    misses = list(dict.fromkeys(text for text, value in results.items() if value is None))
+    if misses:
+        translations = dict(zip(misses, _translate_batch(misses, target)))
+        set_many(get_backend(), NAMESPACE, [(_storage_key(target, text), value) for text, value in translations.items()])
+        with _lock:
+            for text, value in translations.items():
+                _remember((target, text), value)
+        results.update(translations)
+    return results
+
+
+def translate(text, target=DEFAULT_TARGET):
+    text = _normalize(text)
+    if not text:
+        return text
+    return translate_many([text], target)[text]
+
+
+def character_vocabulary(char):
+    return [str(char.get(key)) for key in TRANSLATED_KEYS if char.get(key)]
+
+
+def prewarm(characters, target=DEFAULT_TARGET, batch_size=50):
+    """Fill the cache with every attribute value found in the given characters."""
+    vocabulary = list(dict.fromkeys(
+        _normalize(value) for char in characters for value in character_vocabulary(char)
+    ))
+    misses = [text for text in vocabulary if get_cached(text, target) is None]
+    for start in range(0, len(misses), batch_size):
+        translate_many(misses[start:start + batch_size], target)
+    return len(vocabulary), len(misses)
+
+
+if __name__ == "__main__":
+    from utils.catalog import get_catalog
+
+    parser = argparse.ArgumentParser(description="Manage the character attribute translation cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    prewarm_parser = subparsers.add_parser("prewarm", help="Translate the attribute vocabulary of the whole catalog")
+    prewarm_parser.add_argument("--target", default=DEFAULT_TARGET)
+    args = parser.parse_args()
+
+    total, translated = prewarm(get_catalog().records.values(), args.target)
+    print(f"Vocabulary: {total} values, newly translated: {translated}")